@@ -0,0 +1,312 @@
+"""
+Processes a whole directory (or glob) of GL reports, one year per worker
+process, and puts them together into one consolidated ledger.
+
+Each year's closing balances should be the next year's opening balances,
+so every account's "Ending Balance" is checked against the next year's
+"Balance Forward", and anything that doesn't carry over (or a missing
+year, or a year that failed) is flagged as a break.
+"""
+
+from utils import *
+from gl_processor import GLProcessor
+from disk_cache import DiskCache
+from excel_export import ExcelExporter, COLUMNS
+from search_index import SearchIndex
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import os
+import glob
+import traceback
+
+
+class YearResult(NamedTuple):
+    year: int
+    filename: str
+    # The SQLite ledger the year was saved to, if it got that far
+    ledger: Optional[str] = None
+    valid: bool = False
+    error: Optional[str] = None
+
+
+class Link(NamedTuple):
+    """
+    One account carried over from one year to the next.
+    """
+
+    account: str
+    number: Optional[str]
+    year: int
+    closing: Optional[Decimal]
+    opening: Optional[Decimal]
+    reason: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.reason is None
+
+
+def report_year(filename: str) -> Optional[int]:
+    """
+    The year a report is for, going by its name (e.g. GL2022.txt).
+    """
+
+    m = re.search(r"\d{4}", os.path.basename(filename))
+    return None if m is None else int(m.group(0))
+
+
+def find_reports(pattern: str) -> Dict[int, str]:
+    """
+    The reports in a directory (or matching a glob), by year.
+    Anything without a year in its name is skipped.
+    """
+
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.txt")
+
+    reports = {}
+    for filename in sorted(glob.glob(pattern)):
+        yr = report_year(filename)
+        if yr is None:
+            print(f"Skipping {filename}, it doesn't have a year in its name.")
+        elif yr in reports:
+            raise ValueError(
+                f"Both {reports[yr]} and {filename} are reports for {yr}."
+            )
+        else:
+            reports[yr] = filename
+
+    return dict(sorted(reports.items()))
+
+
+def process_year(
+    filename: str,
+    yr: int,
+    timeout: Optional[float] = None,
+    fmt: str = "json",
+    cache: Optional[Dict[str, Any]] = None,
+    strict: bool = True
+) -> YearResult:
+    """
+    Runs in a worker process: process one year's report like the command
+    line would (one process, nothing in parallel within the year),
+    and also save it as a SQLite ledger for the consolidation.
+    `cache` is the keyword arguments for a DiskCache, if there is one.
+
+    With a timeout, each month is solved in a process of its own (see
+    GLProcessor.process), so a month that takes too long is given up on
+    and the year comes back not valid, instead of holding up (or, in
+    strict mode, failing) the whole year.
+    """
+
+    g = None
+    try:
+        g = GLProcessor(
+            filename,
+            yr,
+            DiskCache(**cache) if cache else None,
+            strict=strict
+        )
+        g.process(1, timeout, fmt)
+        ledger = filename.replace(".txt", "_processed.db")
+        if fmt != "sqlite":
+            g.save(ledger, fmt="sqlite", cube=False)
+
+        g.save_to_excel()
+        return YearResult(yr, filename, ledger, g.all_valid)
+    except Exception:
+        where = "" if g is None else f" (page {g.page + 1}, line {g.line})"
+        return YearResult(
+            yr, filename, error=f"Failed{where}:\n{traceback.format_exc()}"
+        )
+
+
+def link_years(
+    years: List[int], ledgers: Dict[int, GLProcessor]
+) -> List[Link]:
+    """
+    Check every account's closing balance in one year against
+    its opening balance in the next, for each pair of consecutive years.
+    """
+
+    links = []
+    for yr in range(years[0], years[-1]):
+        nxt = yr + 1
+        this, that = ledgers.get(yr), ledgers.get(nxt)
+        if this is None or that is None:
+            missing = yr if this is None else nxt
+            reason = (
+                f"no ledger for {missing}" if missing in years
+                else f"no report for {missing}"
+            )
+            g = this or that
+            for header, (opening, closing) in (
+                g.balance_forwards.items() if g else []
+            ):
+                links.append(Link(
+                    header,
+                    g.header_numbers.get(header),
+                    yr,
+                    closing.amt if g is this else None,
+                    opening.amt if g is that else None,
+                    reason
+                ))
+
+            continue
+
+        headers = list(this.balance_forwards) + [
+            h for h in that.balance_forwards
+            if h not in this.balance_forwards
+        ]
+        for header in headers:
+            closing = opening = None
+            if header in this.balance_forwards:
+                closing = this.balance_forwards[header][1].amt
+
+            if header in that.balance_forwards:
+                opening = that.balance_forwards[header][0].amt
+
+            reason = None
+            if opening is None and closing:
+                reason = f"not in {nxt}"
+            elif closing is None and opening:
+                reason = f"not in {yr}"
+            elif (opening or 0) != (closing or 0):
+                reason = (
+                    "ending balance doesn't match the next balance forward"
+                )
+
+            num = this.header_numbers.get(header)
+            if num is None:
+                num = that.header_numbers.get(header)
+
+            links.append(Link(header, num, yr, closing, opening, reason))
+
+    return links
+
+
+def write_consolidated(
+    ledgers: Dict[int, GLProcessor], links: List[Link], filename: str
+) -> None:
+    """
+    One sheet per account with every year's transactions in order
+    (each year between its Balance Forward and Ending Balance),
+    plus a Continuity sheet with every year-to-year link.
+    """
+
+    numbers: Dict[str, str] = {}
+    for g in ledgers.values():
+        for header in g.transactions:
+            numbers.setdefault(header, g.header_numbers[header])
+
+    exporter = ExcelExporter(filename)
+    try:
+        for header in sorted(numbers, key=lambda h: float(numbers[h])):
+            ws = exporter.sheet(numbers[header], ["year"] + COLUMNS)
+            row = 1
+            for yr, g in ledgers.items():
+                if header not in g.transactions:
+                    continue
+
+                opening, closing = g.balance_forwards[header]
+                trs = [opening] + g.transactions[header] + [closing]
+                for t in trs:
+                    ws.write_number(row, 0, yr)
+                    exporter.write_transaction(ws, row, 1, t)
+                    row += 1
+
+        ws = exporter.sheet("Continuity", [
+            "account", "header", "year", "ending balance",
+            "next balance forward", "break",
+        ])
+        for row, link in enumerate(links, start=1):
+            if link.number is not None:
+                ws.write_string(row, 0, link.number)
+
+            ws.write_string(row, 1, link.account)
+            ws.write_number(row, 2, link.year)
+            if link.closing is not None:
+                ws.write_number(row, 3, float(link.closing))
+
+            if link.opening is not None:
+                ws.write_number(row, 4, float(link.opening))
+
+            if link.reason is not None:
+                ws.write_string(row, 5, link.reason)
+    finally:
+        exporter.close()
+
+
+def run_batch(
+    pattern: str,
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    fmt: str = "json",
+    cache: Optional[Dict[str, Any]] = None,
+    filename: Optional[str] = None,
+    search_index: Optional[str] = None,
+    strict: bool = True
+) -> Tuple[List[YearResult], List[Link]]:
+    """
+    Process every report matching `pattern` (a directory or a glob),
+    a year per worker process, then write the consolidated ledger to
+    `filename` (by default GL<first>-<last>_consolidated.xlsx, next to
+    the first report). Returns the results for each year and the links.
+
+    The years update the search index (if there is one) from here,
+    once they're done, rather than all at once from the workers.
+    """
+
+    reports = find_reports(pattern)
+    if not reports:
+        raise ValueError(f"No GL reports found for {pattern}.")
+
+    results: Dict[int, YearResult] = {}
+    with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+        futures = [
+            pool.submit(process_year, f, yr, timeout, fmt, cache, strict)
+            for yr, f in reports.items()
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result.year] = result
+            status = "valid" if result.valid else "NOT valid"
+            if result.error is not None:
+                status = "failed"
+
+            print(f"{result.year}: {result.filename} {status}")
+
+    years = list(reports)
+    ledgers = {
+        yr: GLProcessor.from_sqlite(results[yr].ledger)
+        for yr in years if results[yr].error is None
+    }
+    links = link_years(years, ledgers)
+    if search_index is not None:
+        index = SearchIndex(search_index)
+        for g in ledgers.values():
+            index.update(g)
+
+    if filename is None:
+        filename = os.path.join(
+            os.path.dirname(reports[years[0]]),
+            f"GL{years[0]}-{years[-1]}_consolidated.xlsx"
+        )
+
+    write_consolidated(ledgers, links, filename)
+
+    for yr in years:
+        if results[yr].error is not None:
+            print(f"{yr} failed: {results[yr].error}")
+
+    breaks = [link for link in links if not link.ok]
+    print(f"{len(breaks)} break(s) between years:")
+    for link in breaks:
+        print(
+            f"    {link.number} {link.account}, {link.year} to "
+            f"{link.year + 1}: {link.reason} "
+            f"(ending {link.closing}, next forward {link.opening})"
+        )
+
+    print(f"Consolidated ledger saved to {filename}")
+    return [results[yr] for yr in years], links
@@ -0,0 +1,303 @@
+"""
+Benchmarks gl_processor on synthetic reports (see synthetic.py),
+so it can be timed without the real, confidential ones.
+
+Each run happens in a fresh process, and reports how long every stage
+took (indexing the pages, parsing, validating, disambiguating, saving),
+lines per second through the parser, and peak memory. Results can be
+saved as JSON and compared against an earlier run, to catch regressions:
+
+    python benchmark.py --sizes 1k,100k,1M --json before.json
+    ...
+    python benchmark.py --sizes 1k,100k,1M --baseline before.json
+"""
+
+from utils import *
+from synthetic import generate
+from concurrent.futures import ProcessPoolExecutor
+
+import os
+import sys
+import json
+import argparse
+import contextlib
+
+try:
+    import resource
+except ImportError:
+    # Windows doesn't have it
+    resource = None
+
+STAGES = ["index", "parse", "validate", "disambiguate", "save", "excel"]
+SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def parse_size(size: str) -> int:
+    """
+    10k -> 10000, 1M -> 1000000.
+    """
+
+    size = size.strip().lower()
+    if size[-1:] in SUFFIXES:
+        return int(float(size[:-1]) * SUFFIXES[size[-1]])
+
+    return int(size)
+
+
+def peak_rss() -> Tuple[Optional[float], Optional[float]]:
+    """
+    Peak resident memory in MB of this process, and of the largest
+    of its (finished) children, if the platform can tell us.
+    """
+
+    if resource is None:
+        return None, None
+
+    # Linux reports KB, macOS reports bytes
+    scale = 1 / 2**20 if sys.platform == "darwin" else 1 / 2**10
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return own, children
+
+
+def report_file(
+    directory: str, lines: int, ambiguity: float, seed: int, yr: int
+) -> str:
+    """
+    The synthetic report for these settings, generated if it isn't there.
+    """
+
+    filename = os.path.join(
+        directory, f"GL{yr}_{lines}_{ambiguity}_{seed}.txt"
+    )
+    if not os.path.exists(filename):
+        print(f"Generating {filename}")
+        generate(filename, lines, yr, ambiguity, seed)
+
+    return filename
+
+
+def count_lines(filename: str) -> int:
+    lines = 0
+    with open(filename, "rb") as f:
+        while chunk := f.read(1 << 20):
+            lines += chunk.count(b"\n")
+
+    return lines
+
+
+def run_once(
+    filename: str, yr: int, workers: int, excel: bool
+) -> Dict[str, Any]:
+    """
+    Runs in a fresh worker process: process the report the way the
+    command line does, with instruments timing each stage.
+    """
+
+    from gl_processor import GLProcessor
+    from instrumentation import Instruments
+
+    out = os.path.splitext(filename)[0] + "_bench"
+    instruments = Instruments(out + "_instruments.json")
+    with open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull), \
+            contextlib.redirect_stderr(devnull):
+        with instruments.stage("index"):
+            g = GLProcessor(filename, yr, instruments=instruments)
+
+        g.process(workers)
+        if excel:
+            with instruments.stage("excel"):
+                g.save_to_excel(out + ".xlsx")
+
+    rss, children_rss = peak_rss()
+    return {
+        "transactions": instruments.counters.get("transactions", 0),
+        "times": dict(instruments.stages),
+        "peak_rss_mb": rss,
+        "peak_child_rss_mb": children_rss,
+        "valid": g.all_valid,
+        "failures": instruments.counters.get("failures", 0),
+    }
+
+
+def benchmark(
+    sizes: List[int],
+    directory: str,
+    ambiguity: float = 0.02,
+    seed: int = 0,
+    yr: int = 2022,
+    workers: int = 1,
+    excel: bool = False,
+    repeat: int = 1
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Run every size `repeat` times (each in its own process), keeping
+    the fastest time for each stage. Results are keyed by size.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    results = {}
+    for size in sizes:
+        filename = report_file(directory, size, ambiguity, seed, yr)
+        lines = count_lines(filename)
+        best = None
+        for _ in range(repeat):
+            with ProcessPoolExecutor(1) as pool:
+                future = pool.submit(run_once, filename, yr, workers, excel)
+                r = future.result()
+
+            if best is None:
+                best = r
+            else:
+                for stage, t in r["times"].items():
+                    best["times"][stage] = min(best["times"][stage], t)
+
+                for k in ("peak_rss_mb", "peak_child_rss_mb"):
+                    if r[k] is not None:
+                        best[k] = max(best[k], r[k])
+
+        best["lines"] = lines
+        best["lines_per_sec"] = lines / best["times"]["parse"]
+        results[str(size)] = best
+
+    return results
+
+
+def fmt_mb(mb: Optional[float]) -> str:
+    return "n/a" if mb is None else f"{mb:.0f}"
+
+
+def print_results(results: Dict[str, Dict[str, Any]]) -> None:
+    stages = [
+        s for s in STAGES if any(s in r["times"] for r in results.values())
+    ]
+    print(
+        f"{'lines':>10}{'trans':>10}{'lines/s':>11}{'RSS MB':>8}"
+        + "".join(f"{s:>13}" for s in stages)
+    )
+    for r in results.values():
+        print(
+            f"{r['lines']:>10}{r['transactions']:>10}"
+            f"{r['lines_per_sec']:>11.0f}{fmt_mb(r['peak_rss_mb']):>8}"
+            + "".join(
+                f"{r['times'][s]:>12.3f}s" if s in r["times"] else f"{'':>13}"
+                for s in stages
+            )
+        )
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float
+) -> List[str]:
+    """
+    Every stage (and peak memory) that got more than `tolerance`
+    (as a fraction) worse than in the baseline.
+    Tiny times are too noisy to compare, so anything under 50ms is skipped.
+    """
+
+    regressions = []
+    for size, r in results.items():
+        if size not in baseline:
+            continue
+
+        b = baseline[size]
+        for stage, t in r["times"].items():
+            old = b["times"].get(stage)
+            if old is None or max(old, t) < 0.05:
+                continue
+
+            if t > old * (1 + tolerance):
+                regressions.append(
+                    f"{size} lines, {stage}: {old:.3f}s -> {t:.3f}s "
+                    f"({t / old - 1:+.0%})"
+                )
+
+        old, new = b.get("peak_rss_mb"), r.get("peak_rss_mb")
+        if old and new and new > old * (1 + tolerance):
+            regressions.append(
+                f"{size} lines, peak RSS: {old:.0f}MB -> {new:.0f}MB "
+                f"({new / old - 1:+.0%})"
+            )
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark gl_processor on synthetic GL reports."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=str,
+        default="1k,10k,100k",
+        help="Comma separated report sizes in lines, e.g. 1k,100k,10M."
+    )
+    parser.add_argument(
+        "--dir",
+        type=str,
+        default=".gl_bench",
+        help="Where to keep the generated reports."
+    )
+    parser.add_argument("--ambiguity", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--year", type=int, default=2022)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes to parse and disambiguate with."
+    )
+    parser.add_argument(
+        "--excel", action="store_true", help="Time the Excel export too."
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Keep the best of this many."
+    )
+    parser.add_argument(
+        "--json", type=str, default=None, help="Save the results here."
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Results from an earlier --json run to compare against."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="How much slower (as a fraction) counts as a regression."
+    )
+
+    args = parser.parse_args()
+    results = benchmark(
+        [parse_size(s) for s in args.sizes.split(",")],
+        args.dir,
+        args.ambiguity,
+        args.seed,
+        args.year,
+        args.workers,
+        args.excel,
+        args.repeat,
+    )
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+        if regressions:
+            print(f"{len(regressions)} regression(s):")
+            for r in regressions:
+                print(f"    {r}")
+
+            sys.exit(1)
+
+        print("No regressions.")
@@ -0,0 +1,121 @@
+"""
+JSON Lines checkpoints of a GL parse, so that a long run that dies part
+way through (a crash, Ctrl-C, ...) can pick up where it left off instead
+of parsing everything again.
+
+The first line says which report (and which version of the parser) the
+checkpoint is for. After that there's a line for every parsed page (or
+run of pages, when they're parsed in worker processes), in order, with
+everything parsing it added (see GLProcessor.checkpoint_pages).
+Every line is flushed as it's written, so at worst the last one is cut
+short, and that one is dropped when the checkpoint is loaded.
+"""
+
+from typing import Any, Dict, List, Optional, IO
+
+import os
+import json
+
+CHECKPOINT_VERSION = 3
+
+
+class Checkpoint:
+    def __init__(self, filename: str, resume: bool = False):
+        """
+        Write a checkpoint to `filename`. If `resume` is set, whatever
+        is already there (for the same report) is picked up first,
+        otherwise it's started over.
+        """
+
+        self.filename = filename
+        self.resume = resume
+        self.file: Optional[IO[bytes]] = None
+        # Where the last complete page ends, in bytes
+        self.end = 0
+        # Records are plain lists and dicts, so there's nothing to check
+        self.encoder = json.JSONEncoder(
+            separators=(",", ":"), check_circular=False
+        )
+
+    def load(self, key: str) -> List[Dict[str, Any]]:
+        """
+        The records saved in the checkpoint, in order, if it's for the
+        report `key` stands for. Otherwise there's nothing to resume.
+        Each record has the first page it's for and how many pages.
+        """
+
+        self.end = 0
+        try:
+            f = open(self.filename, "rb")
+        except FileNotFoundError:
+            return []
+
+        records = []
+        pages = 0
+        with f:
+            first = f.readline()
+            try:
+                head = json.loads(first)
+            except ValueError:
+                return []
+
+            if (
+                head.get("version") != CHECKPOINT_VERSION
+                or head.get("key") != key
+            ):
+                return []
+
+            end = len(first)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+
+                if record.get("page") != pages:
+                    break
+
+                records.append(record)
+                pages += record["pages"]
+                end += len(line)
+
+        self.end = end
+        return records
+
+    def start(self, key: str, pages: int = 0) -> None:
+        """
+        Get ready to write pages, keeping the first `pages` of them
+        from what was loaded, or starting over if that's 0.
+        """
+
+        if pages:
+            self.file = open(self.filename, "r+b")
+            self.file.truncate(self.end)
+            self.file.seek(self.end)
+            return
+
+        self.file = open(self.filename, "wb")
+        self.write({"version": CHECKPOINT_VERSION, "key": key})
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self.file.write(self.encoder.encode(record).encode() + b"\n")
+        self.file.flush()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def remove(self) -> None:
+        """
+        Throw the checkpoint away, once the run it was for is done.
+        """
+
+        self.close()
+        try:
+            os.remove(self.filename)
+        except FileNotFoundError:
+            pass
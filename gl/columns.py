@@ -0,0 +1,137 @@
+"""
+Column-wise copies of the transactions of a single account.
+
+The list of Transactions is still what gets saved and exported, but
+everything that only needs the numbers (validation, disambiguation)
+works on these instead, as NumPy arrays, so it doesn't have to loop
+over every transaction in Python.
+"""
+
+from utils import *
+from array import array
+
+
+def tag_code(tag: Optional[str]) -> int:
+    """
+    Small integer for a transaction's tag. Anything that isn't one of
+    the usual tags (locations, CNIN, ...) gets len(TAGS).
+    """
+
+    try:
+        return TAGS.index(tag)
+    except ValueError:
+        return len(TAGS)
+
+
+class AccountColumns:
+    def __init__(self):
+        """
+        Transactions are appended to plain arrays (cheap to grow),
+        and only turned into NumPy arrays when something asks for them.
+        """
+
+        self.buffers = {
+            "ordinal": array("q"),
+            "month": array("b"),
+            "cents": array("q"),
+            "tag": array("b"),
+            "ambiguous": array("b"),
+        }
+        self.arrays: Optional[Dict[str, np.ndarray]] = None
+
+        # Running debits and credits (in cents) by month number,
+        # so checking a month against its totals doesn't need a pass
+        self.sums = [[0, 0] for _ in range(13)]
+
+    def __len__(self) -> int:
+        return len(self.buffers["cents"])
+
+    def append(self, transaction: Transaction) -> None:
+        b = self.buffers
+        b["ordinal"].append(transaction.ordinal)
+        b["month"].append(transaction.month)
+        b["cents"].append(transaction.cents)
+        b["tag"].append(tag_code(transaction.tag))
+        b["ambiguous"].append(bool(transaction.ambiguous))
+        self.arrays = None
+
+        cents = transaction.cents
+        if cents > 0:
+            self.sums[transaction.month][0] += cents
+        else:
+            self.sums[transaction.month][1] -= cents
+
+    def extend(self, transactions: List[Transaction]) -> None:
+        """
+        append for a whole run of transactions at once.
+        """
+
+        b = self.buffers
+        b["ordinal"].extend([t.ordinal for t in transactions])
+        b["month"].extend([t.month for t in transactions])
+        b["cents"].extend([t.cents for t in transactions])
+        b["tag"].extend([tag_code(t.tag) for t in transactions])
+        b["ambiguous"].extend([bool(t.ambiguous) for t in transactions])
+        self.arrays = None
+
+        for t in transactions:
+            if t.cents > 0:
+                self.sums[t.month][0] += t.cents
+            else:
+                self.sums[t.month][1] -= t.cents
+
+    def set_cents(self, i: int, cents: int) -> None:
+        """
+        Keep the amounts in sync when a transaction gets flipped.
+        """
+
+        sums = self.sums[self.buffers["month"][i]]
+        old = self.buffers["cents"][i]
+        sums[0] += max(cents, 0) - max(old, 0)
+        sums[1] += max(-cents, 0) - max(-old, 0)
+
+        self.buffers["cents"][i] = cents
+        if self.arrays is not None:
+            self.arrays["cents"][i] = cents
+
+    def column(self, name: str) -> np.ndarray:
+        if self.arrays is None:
+            self.arrays = {
+                k: np.array(v, dtype=np.int64) for k, v in self.buffers.items()
+            }
+            self.arrays["ambiguous"] = self.arrays["ambiguous"].astype(bool)
+
+        return self.arrays[name]
+
+    @property
+    def ordinal(self) -> np.ndarray:
+        return self.column("ordinal")
+
+    @property
+    def month(self) -> np.ndarray:
+        return self.column("month")
+
+    @property
+    def cents(self) -> np.ndarray:
+        return self.column("cents")
+
+    @property
+    def tag(self) -> np.ndarray:
+        return self.column("tag")
+
+    @property
+    def ambiguous(self) -> np.ndarray:
+        return self.column("ambiguous")
+
+
+def cents_table(totals: Dict[str, List[Decimal]]) -> np.ndarray:
+    """
+    The monthly totals of one header as a 13x2 array of cents,
+    laid out the same way as AccountColumns.sums.
+    """
+
+    table = np.zeros((13, 2), dtype=np.int64)
+    for month, (deb, cred) in totals.items():
+        table[MONTHS[month]] = to_cents(deb), to_cents(cred)
+
+    return table
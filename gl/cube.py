@@ -0,0 +1,297 @@
+"""
+The debits and credits of a processed GL report added up by account,
+month and tag (and by location, for the accounts that are for one,
+like Rent-Abdn or Cash Float-Hby), so that reports like the trial balance,
+a P&L by location or monthly trends by source (AP/AR/GL/PS/PR) can be
+put together without going through the transactions again.
+
+GLProcessor.save writes the cube next to the processed report
+(GL2022_cube.json), and save_to_excel writes the trial balance from it.
+Either can be done from a saved cube too:
+
+    python cube.py GL2022_cube.json --excel GL2022_trial_balance.xlsx
+"""
+
+from utils import *
+from excel_export import ExcelExporter
+
+import json
+import argparse
+
+CUBE_VERSION = 1
+
+# The tag axis: the usual tags, then everything else (untagged lines,
+# lines tagged with a location, ...), the same way columns.tag_code has it
+OTHER = "Other"
+CUBE_TAGS = TAGS + [OTHER]
+
+TRIAL_BALANCE_COLUMNS = [
+    "number", "account", "opening", "debits", "credits",
+    "debit balance", "credit balance",
+]
+
+
+class TrialBalanceRow(NamedTuple):
+    number: str
+    account: str
+    opening: Decimal
+    debits: Decimal
+    credits: Decimal
+    closing: Decimal
+
+    @property
+    def debit_balance(self) -> Decimal:
+        return max(self.closing, Decimal("0.00"))
+
+    @property
+    def credit_balance(self) -> Decimal:
+        return max(-self.closing, Decimal("0.00"))
+
+
+def dollars(cents: int) -> Decimal:
+    return Decimal(int(cents)).scaleb(-2)
+
+
+class AggregateCube:
+    def __init__(
+        self,
+        yr: Optional[int],
+        accounts: List[str],
+        numbers: List[str],
+        cells: np.ndarray,
+        opening: np.ndarray,
+        closing: np.ndarray
+    ):
+        """
+        `cells` holds debits and credits in cents, indexed by account
+        (in the order of `accounts`), month number - 1, tag (see
+        CUBE_TAGS) and debit/credit. `opening` and `closing` are the
+        accounts' balances forward, also in cents.
+        """
+
+        self.yr = yr
+        self.accounts = accounts
+        self.numbers = numbers
+        self.locations = [header_location(h) for h in accounts]
+        self.cells = cells
+        self.opening = opening
+        self.closing = closing
+        self.index = {n: i for i, n in enumerate(numbers)}
+
+    @classmethod
+    def from_processor(cls, g) -> "AggregateCube":
+        """
+        Add up GLProcessor g's transactions, going by its columns
+        (see columns) rather than the transactions themselves.
+
+        Every account with a Balance Forward is in the cube, even if
+        nothing happened in it all year (its cells are all zero), so
+        the trial balance has it too.
+        """
+
+        accounts = sorted(
+            g.balance_forwards, key=lambda h: float(g.header_numbers[h])
+        )
+        cells = np.zeros((len(accounts), 13, len(CUBE_TAGS), 2), np.int64)
+        for i, h in enumerate(accounts):
+            cols = g.columns.get(h)
+            if cols is None:
+                continue
+
+            at = (cols.month, cols.tag)
+            np.add.at(cells[i, :, :, 0], at, np.maximum(cols.cents, 0))
+            np.add.at(cells[i, :, :, 1], at, np.maximum(-cols.cents, 0))
+
+        balances = np.array(
+            [
+                [to_cents(t.amt) for t in g.balance_forwards[h]]
+                for h in accounts
+            ],
+            dtype=np.int64
+        ).reshape(-1, 2)
+
+        return cls(
+            g.yr,
+            accounts,
+            [g.header_numbers[h] for h in accounts],
+            cells[:, 1:],
+            balances[:, 0],
+            balances[:, 1],
+        )
+
+    def save(self, filename: str) -> None:
+        with open(filename, "w") as f:
+            json.dump(
+                {
+                    "version": CUBE_VERSION,
+                    "year": self.yr,
+                    "tags": CUBE_TAGS,
+                    "accounts": [
+                        {
+                            "number": n,
+                            "account": h,
+                            "location": loc,
+                            "opening": int(self.opening[i]),
+                            "closing": int(self.closing[i]),
+                            "cells": self.cells[i].tolist(),
+                        }
+                        for i, (n, h, loc) in enumerate(zip(
+                            self.numbers, self.accounts, self.locations
+                        ))
+                    ],
+                },
+                f
+            )
+
+    @classmethod
+    def load(cls, filename: str) -> "AggregateCube":
+        with open(filename) as f:
+            d = json.load(f)
+
+        version = d.get("version")
+        if version != CUBE_VERSION or d.get("tags") != CUBE_TAGS:
+            raise ValueError(
+                f"{filename} is a version {version} cube, but this is "
+                f"version {CUBE_VERSION}. Process the report again."
+            )
+
+        accounts = d["accounts"]
+        return cls(
+            d["year"],
+            [a["account"] for a in accounts],
+            [a["number"] for a in accounts],
+            np.array(
+                [a["cells"] for a in accounts], dtype=np.int64
+            ).reshape(-1, 12, len(CUBE_TAGS), 2),
+            np.array([a["opening"] for a in accounts], dtype=np.int64),
+            np.array([a["closing"] for a in accounts], dtype=np.int64),
+        )
+
+    def account(self, account: str) -> int:
+        """
+        Where an account is in the cube, given its number or its header.
+        """
+
+        if account in self.index:
+            return self.index[account]
+
+        if account in self.accounts:
+            return self.accounts.index(account)
+
+        raise ValueError(f"No account {account} in the cube.")
+
+    def total(
+        self,
+        accounts: Optional[List[str]] = None,
+        month: Optional[str] = None,
+        tag: Optional[str] = None,
+        location: Optional[str] = None
+    ) -> Tuple[Decimal, Decimal]:
+        """
+        Debits and credits, over the given accounts (numbers or headers)
+        or all of them, in one month or the whole year, with one tag or
+        all of them, and only for the accounts of one location if
+        `location` is given.
+        """
+
+        rows = range(len(self.accounts)) if accounts is None else [
+            self.account(a) for a in accounts
+        ]
+        if location is not None:
+            rows = [i for i in rows if self.locations[i] == location]
+
+        cells = self.cells[list(rows)]
+        if month is not None:
+            cells = cells[:, MONTHS[month] - 1]
+
+        if tag is not None:
+            cells = cells[..., CUBE_TAGS.index(tag), :]
+
+        debits, credits = cells.reshape(-1, 2).sum(axis=0).tolist()
+        return dollars(debits), dollars(credits)
+
+    def monthly(self, account: str) -> np.ndarray:
+        """
+        An account's debits and credits (in cents) by month and tag,
+        as a 12 x len(CUBE_TAGS) x 2 array.
+        """
+
+        return self.cells[self.account(account)]
+
+    def trial_balance(self) -> List[TrialBalanceRow]:
+        """
+        Every account's opening balance, its debits and credits over
+        the year, and its closing balance, by account number.
+        """
+
+        sums = self.cells.sum(axis=(1, 2))
+        return [
+            TrialBalanceRow(
+                n,
+                h,
+                dollars(self.opening[i]),
+                dollars(sums[i, 0]),
+                dollars(sums[i, 1]),
+                dollars(self.closing[i]),
+            )
+            for i, (n, h) in enumerate(zip(self.numbers, self.accounts))
+        ]
+
+    def save_trial_balance(self, filename: str) -> None:
+        """
+        Write the trial balance to an Excel file, with the totals
+        (the debit and credit balances should come out the same) last.
+        """
+
+        rows = self.trial_balance()
+        exporter = ExcelExporter(filename)
+        try:
+            ws = exporter.sheet("Trial Balance", TRIAL_BALANCE_COLUMNS)
+            for r, row in enumerate(rows, start=1):
+                ws.write_string(r, 0, row.number)
+                ws.write_string(r, 1, row.account)
+                for c, amt in enumerate([
+                    row.opening, row.debits, row.credits,
+                    row.debit_balance, row.credit_balance,
+                ], start=2):
+                    ws.write_number(r, c, float(amt))
+
+            r = len(rows) + 1
+            ws.write_string(r, 1, "Total", exporter.header_format)
+            for c, amts in enumerate([
+                [row.debits for row in rows],
+                [row.credits for row in rows],
+                [row.debit_balance for row in rows],
+                [row.credit_balance for row in rows],
+            ], start=3):
+                ws.write_number(r, c, float(sum(amts)))
+        finally:
+            exporter.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Print the trial balance from a saved aggregate cube."
+    )
+    parser.add_argument("cube", type=str, help="e.g. GL2022_cube.json")
+    parser.add_argument(
+        "--excel", type=str, default=None, help="Also save it here."
+    )
+
+    args = parser.parse_args()
+    cube = AggregateCube.load(args.cube)
+    rows = cube.trial_balance()
+    for row in rows:
+        print(
+            f"{row.number:>6}  {row.account:<32}{row.debit_balance:>14}"
+            f"{row.credit_balance:>14}"
+        )
+
+    print(
+        f"{'':>6}  {'Total':<32}"
+        f"{sum(row.debit_balance for row in rows):>14}"
+        f"{sum(row.credit_balance for row in rows):>14}"
+    )
+
+    if args.excel:
+        cube.save_trial_balance(args.excel)
@@ -0,0 +1,198 @@
+"""
+Runs disambiguation for several (header, month) pairs at once,
+one worker process per pair, so one slow month doesn't hold up the rest.
+
+The workers only ever see plain amounts in cents and the target totals;
+the GLProcessor is responsible for turning the answers back into signs.
+"""
+
+from utils import *
+from typing import Hashable, Iterator, List
+from multiprocessing.connection import Connection, wait
+
+import os
+import time
+import multiprocessing as mp
+
+
+def solve_worker(
+    conn: Connection, amounts: List[int], deb: int, cred: int, net: bool
+) -> None:
+    """
+    Runs in a worker process. Sends back ("ok", (signs, matches))
+    or ("error", message).
+    """
+
+    try:
+        conn.send(("ok", solve_signs(amounts, deb, cred, net)))
+    except Exception as e:
+        conn.send(("error", repr(e)))
+    finally:
+        conn.close()
+
+
+class Job:
+    def __init__(
+        self,
+        key: Hashable,
+        amounts: List[int],
+        deb: int,
+        cred: int,
+        net: bool
+    ):
+        self.key = key
+        self.args = (amounts, deb, cred, net)
+        self.process: Optional[mp.Process] = None
+        self.conn: Optional[Connection] = None
+        self.started = 0.0
+
+
+class Result:
+    def __init__(
+        self,
+        key: Hashable,
+        signs: Optional[List[int]] = None,
+        matches: int = 0,
+        error: Optional[str] = None
+    ):
+        self.key = key
+        self.signs = signs
+        self.matches = matches
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.signs is not None
+
+
+class DisambiguationPool:
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        timeout: Optional[float] = None
+    ):
+        """
+        Run at most `workers` solves at once (default: one per core),
+        killing any solve that takes longer than `timeout` seconds.
+        """
+
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.pending: List[Job] = []
+        self.running: List[Job] = []
+        self.done: List[Result] = []
+
+    def submit(
+        self,
+        key: Hashable,
+        amounts: List[int],
+        deb: int,
+        cred: int,
+        net: bool = False
+    ) -> None:
+        """
+        Queue up a solve, and start it right away if there's a free worker.
+        """
+
+        self.pending.append(Job(key, amounts, deb, cred, net))
+        self.step()
+
+    def start(self, job: Job) -> None:
+        recv, send = mp.Pipe(duplex=False)
+        job.process = mp.Process(
+            target=solve_worker, args=(send, *job.args), daemon=True
+        )
+        job.process.start()
+        send.close()
+        job.conn = recv
+        job.started = time.monotonic()
+        self.running.append(job)
+
+    def finish(self, job: Job, result: Result, kill: bool = False) -> None:
+        job.conn.close()
+        if kill:
+            job.process.terminate()
+
+        job.process.join()
+        self.running.remove(job)
+        self.done.append(result)
+
+    def step(self, block: float = 0) -> None:
+        """
+        Collect whatever has finished (waiting up to `block` seconds
+        for something to), kill whatever has run out of time,
+        and start pending jobs on the free workers.
+        """
+
+        if self.running:
+            now = time.monotonic()
+            if self.timeout is not None:
+                deadline = min(j.started for j in self.running) + self.timeout
+                block = max(min(block, deadline - now), 0)
+
+            ready = wait([j.conn for j in self.running], timeout=block)
+            for job in [j for j in self.running if j.conn in ready]:
+                try:
+                    status, payload = job.conn.recv()
+                except EOFError:
+                    status, payload = "error", "worker died"
+
+                if status == "ok":
+                    signs, matches = payload
+                    self.finish(job, Result(job.key, signs, matches))
+                else:
+                    self.finish(job, Result(job.key, error=payload))
+
+            now = time.monotonic()
+            for job in list(self.running):
+                if (
+                    self.timeout is not None
+                    and now - job.started > self.timeout
+                ):
+                    self.finish(
+                        job,
+                        Result(job.key, error=f"timed out after "
+                                              f"{self.timeout}s"),
+                        kill=True
+                    )
+
+        while self.pending and len(self.running) < self.workers:
+            self.start(self.pending.pop(0))
+
+    def results(self) -> Iterator[Result]:
+        """
+        Blocks until every submitted job has finished or timed out,
+        yielding results as they come in.
+        """
+
+        while self.pending or self.running or self.done:
+            self.step(block=1.0)
+            done, self.done = self.done, []
+            yield from done
+
+    def cancel(self, key: Hashable) -> None:
+        """
+        Drop a job that's no longer wanted, killing it if it's running.
+        Nothing is reported for it.
+        """
+
+        self.pending = [j for j in self.pending if j.key != key]
+        for job in [j for j in self.running if j.key == key]:
+            job.conn.close()
+            job.process.terminate()
+            job.process.join()
+            self.running.remove(job)
+
+        self.done = [r for r in self.done if r.key != key]
+        self.step()
+
+    def close(self) -> None:
+        """
+        Kill anything still running and drop anything still queued.
+        """
+
+        for job in list(self.running):
+            self.finish(job, Result(job.key, error="cancelled"), kill=True)
+
+        self.pending = []
+        self.done = []
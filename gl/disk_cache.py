@@ -0,0 +1,150 @@
+"""
+A small on-disk cache of pickled values, keyed by (hex) strings.
+
+Entries live in their own files, so several processes can share a cache
+directory. Writes go through a temporary file, so a reader never sees
+half an entry. Entries that haven't been used for `max_age` seconds are
+thrown out by evict(), and so are the least recently used ones once the
+cache is bigger than `max_bytes`.
+"""
+
+from typing import Any, List, Optional, Tuple
+
+import os
+import time
+import pickle
+import tempfile
+
+# 512 MB, 30 days
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+
+
+class DiskCache:
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+        max_age: Optional[float] = DEFAULT_MAX_AGE
+    ):
+        """
+        Cache entries under `directory` (made if it doesn't exist).
+        Either limit can be None to turn it off.
+        """
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".pkl")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        The value stored under `key`, or `default` if there isn't one
+        (or it can't be read any more).
+        """
+
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return default
+        except Exception:
+            # Corrupt or from an incompatible version, just drop it
+            self.misses += 1
+            self.discard(key)
+            return default
+
+        # Using an entry counts as touching it, for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+            raise
+
+    def discard(self, key: str) -> None:
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def entries(self) -> List[Tuple[float, int, str]]:
+        """
+        (last used, size, path) of every entry in the cache.
+        """
+
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".pkl"):
+                    continue
+
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+
+                entries.append((st.st_mtime, st.st_size, path))
+
+        return entries
+
+    def evict(self) -> int:
+        """
+        Throw out entries that are too old, then the least recently used
+        ones until the cache fits in max_bytes. Returns how many went.
+        """
+
+        entries = sorted(self.entries())
+        now = time.time()
+        keep, removed = [], 0
+        for used, size, path in entries:
+            if self.max_age is not None and now - used > self.max_age:
+                removed += self.remove(path)
+            else:
+                keep.append((used, size, path))
+
+        if self.max_bytes is not None:
+            total = sum(size for _, size, _ in keep)
+            for used, size, path in keep:
+                if total <= self.max_bytes:
+                    break
+
+                removed += self.remove(path)
+                total -= size
+
+        return removed
+
+    def remove(self, path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def clear(self) -> None:
+        for _, _, path in self.entries():
+            self.remove(path)
@@ -0,0 +1,137 @@
+"""
+Writes the Excel version of a processed GL report straight from the
+transactions, a row at a time, with xlsxwriter's constant_memory mode.
+
+This is what GLProcessor.save_to_excel uses. It lays the workbook out the
+same way the old pandas export did (a sheet per account, named after its
+number, then a Summary sheet of every transaction), but amounts are
+written as numbers and dates as real dates, and nothing but the current
+row is ever held in memory.
+"""
+
+from utils import *
+
+import xlsxwriter
+
+COLUMNS = ["date", "identifier", "debit", "credit", "tag", "desc"]
+DATE_FORMAT = "mm/dd/yy"
+
+# Excel (1900 system) counts days from 12/30/1899, so a date's serial
+# number is just its ordinal shifted; cheaper than write_datetime
+EXCEL_EPOCH = datetime(1899, 12, 30).toordinal()
+
+
+class ExcelExporter:
+    def __init__(self, filename: str):
+        self.workbook = xlsxwriter.Workbook(
+            filename, {"constant_memory": True}
+        )
+
+        # Same header style pandas uses
+        self.header_format = self.workbook.add_format({
+            "bold": True,
+            "border": 1,
+            "align": "center",
+            "valign": "top",
+        })
+        self.date_format = self.workbook.add_format(
+            {"num_format": DATE_FORMAT}
+        )
+
+    def sheet(self, name: str, columns: List[str]):
+        ws = self.workbook.add_worksheet(name)
+        for c, column in enumerate(columns):
+            ws.write_string(0, c, column, self.header_format)
+
+        return ws
+
+    def write_transaction(
+        self, ws, row: int, col: int, transaction: Transaction
+    ) -> None:
+        """
+        Write one transaction starting at (row, col), in the same
+        columns as Transaction.to_excel_json.
+        """
+
+        t = transaction
+        if t.exact is None:
+            debit, credit = t.debit_cents / 100, t.credit_cents / 100
+        else:
+            debit, credit = float(t.debit), float(t.credit)
+
+        ws.write_number(row, col, t.ordinal - EXCEL_EPOCH, self.date_format)
+        if t.identifier:
+            ws.write_string(row, col + 1, t.identifier)
+
+        if not credit > 0:
+            ws.write_number(row, col + 2, debit)
+
+        if credit != 0:
+            ws.write_number(row, col + 3, credit)
+
+        if t.tag:
+            ws.write_string(row, col + 4, t.tag)
+
+        if t.desc:
+            ws.write_string(row, col + 5, t.desc)
+
+    def account_sheet(
+        self,
+        name: str,
+        transactions: List[Transaction],
+        balance_forwards: List[Transaction]
+    ) -> None:
+        """
+        A sheet for a single account: its opening balance,
+        its transactions, then its closing balance.
+        """
+
+        ws = self.sheet(name, COLUMNS)
+        opening, closing = balance_forwards
+        row = 1
+        for t in itertools.chain([opening], transactions, [closing]):
+            self.write_transaction(ws, row, 0, t)
+            row += 1
+
+    def summary_sheet(
+        self, accounts: List[Tuple[str, List[Transaction]]]
+    ) -> None:
+        """
+        Every transaction of every account, with the account number first.
+        """
+
+        ws = self.sheet("Summary", ["account"] + COLUMNS)
+        row = 1
+        for num, transactions in accounts:
+            for t in transactions:
+                ws.write_string(row, 0, num)
+                self.write_transaction(ws, row, 1, t)
+                row += 1
+
+    def close(self) -> None:
+        self.workbook.close()
+
+
+def export_excel(g, filename: str) -> None:
+    """
+    Write GLProcessor g's transactions to an Excel file.
+    """
+
+    header_order = sorted(
+        g.transactions.keys(), key=lambda x: float(g.header_numbers[x])
+    )
+
+    exporter = ExcelExporter(filename)
+    try:
+        for header in header_order:
+            exporter.account_sheet(
+                g.header_numbers[header],
+                g.transactions[header],
+                g.balance_forwards[header],
+            )
+
+        exporter.summary_sheet(
+            [(g.header_numbers[h], g.transactions[h]) for h in header_order]
+        )
+    finally:
+        exporter.close()
@@ -1,80 +1,429 @@
 from datetime import datetime, timedelta
 from utils import *
-from typing import Dict, List, Callable
+from disambiguator import DisambiguationPool
+from page_store import PageStore
+from columns import AccountColumns, cents_table
+from disk_cache import DiskCache, DEFAULT_MAX_BYTES, DEFAULT_MAX_AGE
+from ledger_db import save_ledger, load_ledger
+from excel_export import export_excel
+from search_index import SearchIndex
+from instrumentation import Instruments
+from checkpoint import Checkpoint
+from cube import AggregateCube
+from typing import Dict, List, Callable, Tuple, Sequence, ContextManager
+from typing import Iterator, Iterable, Set, Union
 from tqdm import tqdm, trange
+from concurrent.futures import ProcessPoolExecutor
 
+import os
+import time
+import contextlib
 import json
-import itertools
+import hashlib
 import pandas as pd
 import argparse
 
 
+# Don't bother handing out fewer pages than this to a worker
+MIN_CHUNK_PAGES = 16
+
+# Bump this whenever parsing changes, so old cached pages aren't used
+PAGE_CACHE_VERSION = 3
+
+# Same for solved months, whenever disambiguation changes what it solves
+SIGNS_CACHE_VERSION = 1
+
+
+class HeaderSpec(NamedTuple):
+    """
+    How the entries under an account header are handled: the name of the
+    GLProcessor method, and the keyword arguments it's called with.
+    """
+
+    handler: str
+    kwargs: Dict[str, str]
+
+
+def compile_headers() -> Dict[str, HeaderSpec]:
+    """
+    Every header we know how to handle, with the {loc} templates filled
+    in, in the order accounts have always been kept (and saved) in.
+    """
+
+    headers = {
+        PURCH: HeaderSpec("process_inventory_like", {"header": PURCH}),
+        INVENT: HeaderSpec("process_inventory_like", {"header": INVENT}),
+        COGSBI: HeaderSpec("process_cogs", {"header": COGSBI}),
+        COGSMI: HeaderSpec("process_cogs", {"header": COGSMI}),
+        DTSHR: HeaderSpec("process_due_to_shareholder", {}),
+        STOPUR: HeaderSpec("process_inventory_like", {"header": STOPUR}),
+    } | {h: HeaderSpec("process_generic", {"header": h}) for h in GENERICS}
+
+    # One cash float per location, after everything else
+    for loc in LOCATIONS:
+        headers[CFLOAT.format(loc=loc)] = HeaderSpec(
+            "process_cash_float", {"location": loc}
+        )
+
+    return headers
+
+
+# Built once, and shared by every GLProcessor
+HEADERS = compile_headers()
+
+
+class Diagnostic(NamedTuple):
+    """
+    Something that went wrong in a tolerant run (strict=False): a line
+    that couldn't be parsed, or an account or month that was left out
+    or left invalid because of one. Pages count from 1 and lines from 0,
+    like in the error messages.
+    """
+
+    message: str
+    page: Optional[int] = None
+    line: Optional[int] = None
+    text: Optional[str] = None
+    account: Optional[str] = None
+    month: Optional[str] = None
+
+    def __str__(self) -> str:
+        where = []
+        if self.page is not None:
+            where.append(f"page {self.page}, line {self.line}")
+
+        if self.account is not None:
+            where.append(self.account)
+
+        if self.month is not None:
+            where.append(self.month)
+
+        out = f"{', '.join(where)}: {self.message}"
+        if self.text:
+            out += f"\n        {self.text}"
+
+        return out
+
+
+class TransactionEvent(NamedTuple):
+    """
+    A transaction, as GLProcessor.iter_transactions finds it.
+    Pages count from 1 and lines from 0, like in the error messages.
+    """
+
+    header: str
+    transaction: Transaction
+    page: int
+    line: int
+
+
+class MonthTotalEvent(NamedTuple):
+    """
+    A "Totals for <month>" line of an account.
+    """
+
+    header: str
+    month: str
+    debits: Decimal
+    credits: Decimal
+    page: int
+    line: int
+
+
+class BalanceForwardEvent(NamedTuple):
+    """
+    The Balance Forward block that closes an account, with the opening
+    and ending balances as the Transactions that bracket the account.
+    """
+
+    header: str
+    opening: Transaction
+    closing: Transaction
+    debits: Decimal
+    credits: Decimal
+    page: int
+    line: int
+
+
+Event = Union[
+    TransactionEvent, MonthTotalEvent, BalanceForwardEvent, Diagnostic
+]
+
+
+class ParseResult(NamedTuple):
+    """
+    What parsing a run of pages adds to a GLProcessor, so that a worker
+    can send it back and the results can be merged in page order.
+    If the parse failed, `error` is set and page/line say where.
+    """
+
+    transactions: Dict[str, List[Transaction]]
+    monthly_totals: Dict[str, Dict[str, List[Decimal]]]
+    balances: Dict[str, List[Decimal]]
+    balance_forwards: Dict[str, List[Transaction]]
+    header_numbers: Dict[str, str]
+    totals: tuple
+    error: Optional[Exception] = None
+    page: int = 0
+    line: int = 0
+    # What the parse recorded, if it was instrumented
+    instruments: Optional[Instruments] = None
+    diagnostics: Sequence[Diagnostic] = ()
+
+
+def parse_pages(
+    filename: str,
+    yr: Optional[int],
+    start: int,
+    stop: int,
+    instrument: bool = False,
+    strict: bool = True
+) -> ParseResult:
+    """
+    Runs in a worker process: parse pages [start, stop) of the report
+    on their own. Every page starts with its account header,
+    so nothing from earlier pages is needed.
+    """
+
+    g = GLProcessor(
+        filename,
+        yr,
+        instruments=Instruments() if instrument else None,
+        strict=strict
+    )
+    try:
+        for p in range(start, stop):
+            g.page = p
+            g.line_loop()
+            g.store.release(p)
+    except Exception as e:
+        return g.parse_result(error=e)
+    finally:
+        g.store.close()
+
+    return g.parse_result()
+
+
+def parse_each_page(
+    filename: str,
+    yr: Optional[int],
+    pages: List[int],
+    instrument: bool = False,
+    strict: bool = True
+) -> List[ParseResult]:
+    """
+    Runs in a worker process: parse each of the given pages separately,
+    so that they can be cached one by one.
+    """
+
+    g = GLProcessor(
+        filename,
+        yr,
+        instruments=Instruments() if instrument else None,
+        strict=strict
+    )
+    try:
+        return [g.parse_page(p) for p in pages]
+    finally:
+        g.store.close()
+
+
 class GLProcessor:
-    def __init__(self, filename: str, yr: Optional[int]=None):
+    def __init__(
+        self,
+        filename: str,
+        yr: Optional[int]=None,
+        cache: Optional[DiskCache] = None,
+        report: bool = True,
+        search_index: Optional[str] = None,
+        instruments: Optional[Instruments] = None,
+        strict: bool = True,
+        checkpoint: Optional[Checkpoint] = None
+    ):
+        """
+        If a cache is given, parsed pages are kept in it, keyed by a hash
+        of their text, so that re-processing a report after a small
+        correction only parses the pages that changed. Months that had
+        to be disambiguated are kept there once they're solved, too.
+
+        report=False is for processors put back together from a saved
+        ledger, which don't need (or might not have) the report itself.
+
+        If search_index is a directory, every save also brings the
+        full-text search index there up to date (see search_index).
+
+        If instruments are given, they record how long each handler and
+        stage takes (see instrumentation), and process saves them as JSON.
+
+        With strict=False, a line that can't be parsed doesn't stop the
+        run: it's noted in self.diagnostics, parsing carries on from the
+        next line it can make sense of, and process reports everything
+        that went wrong at the end.
+
+        If a checkpoint is given, every page is added to it as soon as
+        it's parsed, so a run that dies part way through can be resumed
+        from the last complete page (see checkpoint). It's thrown away
+        once the processed report is saved.
+        """
+
         self.filename = filename
-        with open(filename, "r") as f:
-            self.report = f.read()
 
-        self.pages = [p.strip() for p in self.report.split("\n" * 7)]
-        self.pagelines: List[List[str]] = [
-            [l.strip() for l in p.splitlines()] for p in self.pages
-        ]
-        self.raw_pagelines = [[l for l in p.splitlines()] for p in self.pages]
+        # Pages are only split into lines when they're looked at,
+        # so these read like lists of lines but don't hold the whole report
+        self.store = PageStore(filename if report else None)
+        self.pagelines: Sequence[List[str]] = self.store.stripped
+        self.raw_pagelines: Sequence[List[str]] = self.store.raw
+        self.kinds: Sequence[List[int]] = self.store.kinds
 
         self.page = 0
         self.line = 0
-        self.headers: Dict[str, Callable[[], None]] = {
-            CFLOAT: self.process_cash_float,
-            PURCH: lambda: self.process_inventory_like(PURCH),
-            INVENT: lambda: self.process_inventory_like(INVENT),
-            COGSBI: lambda: self.process_cogs(COGSBI),
-            COGSMI: lambda: self.process_cogs(COGSMI),
-            DTSHR: self.process_due_to_shareholder,
-            STOPUR: lambda: self.process_inventory_like(STOPUR),
-        } | {h: lambda h=h: self.process_generic(h) for h in GENERICS}
-        self.header_numbers: Dict[str, str] = {}
+        # Each header's handler, bound to this processor once it shows up
+        self.handlers: Dict[str, Callable[[], None]] = {}
 
-        for key, func in self.headers.copy().items():
-            if "{loc}" in key:
-                for loc in LOCATIONS:
-                    k = key.format(loc=loc)
+        self.yr = yr
+        self.cache = cache
+        self.search_index = search_index
+        self.instruments = instruments
+        self.strict = strict
+        self.checkpoint = checkpoint
+        self.scratch: Optional["GLProcessor"] = None
+
+        # Disambiguation started while parsing (see process), and what
+        # each (header, month) was submitted with (or found in the cache)
+        self.eager: Optional[DisambiguationPool] = None
+        self.jobs: Dict[Tuple[str, str], tuple] = {}
+        self.solved: Dict[Tuple[str, str], Tuple[List[int], int]] = {}
+
+        # What the current page has turned up, while streaming
+        self.events: Optional[List[Event]] = None
+        # The accounts the last page parsed here had anything for
+        self.page_headers: List[str] = []
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget everything parsed so far.
+        """
 
-                    def f(loc=loc, func=func):
-                        func(location=loc)
+        self.header_numbers: Dict[str, str] = {}
 
-                    self.headers[k] = f
+        # Everything kept per account is only set up once its header
+        # shows up (see add_account)
+        self.transactions: Dict[str, List[Transaction]] = {}
+        # The same transactions, column by column, for the number crunching
+        self.columns: Dict[str, AccountColumns] = {}
+        self.monthly_totals: Dict[str, Dict[str, List[Decimal]]] = {}
+        self.valid: Dict[str, Dict[str, List[bool]]] = {}
 
-                del self.headers[key]
-            elif "{pos}" in key:
-                for pos in POSITIONS:
-                    k = key.format(pos=pos)
+        self.balances: Dict[str, List[Decimal]] = {}
+        self.balance_forwards: Dict[str, List[Transaction]] = {}
+        self.totals = tuple()
+        self.diagnostics: List[Diagnostic] = []
+        self.unknown_accounts: Set[str] = set()
 
-                    def f(pos=pos, func=func):
-                        func(position=pos)
+    def add_account(self, header: str) -> None:
+        """
+        Set up what's kept for an account, the first time it shows up.
+        Months are checked as their totals are read, in whatever order,
+        so they're laid out in calendar order up front.
+        """
 
-                    self.headers[k] = f
+        z = Decimal(0)
+        self.transactions[header] = []
+        self.columns[header] = AccountColumns()
+        self.monthly_totals[header] = {m: [z, z] for m in MONTHS}
+        self.valid[header] = {m: False for m in MONTHS}
+        if header not in self.handlers:
+            spec = HEADERS[header]
+            self.handlers[header] = functools.partial(
+                getattr(self, spec.handler), **spec.kwargs
+            )
 
-        self.transactions: Dict[str, List[Transaction]] = {
-            h: [] for h in self.headers
-        }
+    def all_monthly_totals(self) -> Dict[str, Dict[str, List[Decimal]]]:
+        """
+        The monthly totals of every account in HEADERS, with zeros for
+        the ones that weren't in the report, the way they're saved.
+        """
 
         z = Decimal(0)
-        self.monthly_totals = {
-            h: {m: [z, z] for m in MONTHS} for h in self.headers
+        return {
+            h: self.monthly_totals.get(h) or {m: [z, z] for m in MONTHS}
+            for h in HEADERS
         }
 
-        self.balances: Dict[str, List[Decimal]] = {}
-        self.balance_forwards: Dict[str, List[Transaction]] = {}
-        self.valid: Dict[str, Dict[str, List[bool]]] = {
-            h: {} for h in self.headers
-        }
+    @classmethod
+    def from_sqlite(cls, filename: str) -> "GLProcessor":
+        """
+        Put a processor back together from a ledger saved with
+        save(fmt="sqlite"), without parsing the report again.
+        """
 
-        self.totals = tuple()
-        self.yr = yr
+        ledger = load_ledger(filename)
+        g = cls(ledger["filename"], ledger["yr"], report=False)
+        for header, transactions in ledger["transactions"].items():
+            g.add_account(header)
+            for transaction in transactions:
+                g.record(header, transaction)
+
+        for header, months in ledger["monthly_totals"].items():
+            g.monthly_totals[header] = months
+
+        g.header_numbers = ledger["header_numbers"]
+        g.balances = ledger["balances"]
+        g.balance_forwards = ledger["balance_forwards"]
+        g.valid = ledger["valid"]
+        g.totals = ledger["totals"]
+        return g
+
+    def save(
+        self,
+        filename: Optional[str] = None,
+        fmt: str = "json",
+        cube: bool = True,
+        search: bool = True
+    ) -> None:
+        """
+        Save the processed GL report to a file,
+        either as JSON or as a SQLite database (see ledger_db),
+        along with its aggregate cube (see cube) unless cube=False,
+        e.g. for a second copy in another format. The search index
+        (if there is one) is updated too, unless search=False.
+        """
+
+        if fmt == "sqlite":
+            if not filename:
+                filename = self.filename.replace(".txt", "_processed.db")
+
+            save_ledger(self, filename)
+        elif fmt == "json":
+            self.save_json(filename)
+        else:
+            raise ValueError(f"Unknown format {fmt}.")
+
+        if cube:
+            self.cube().save(self.cube_filename())
+
+        if search and self.search_index is not None:
+            SearchIndex(self.search_index).update(self)
+
+    def cube(self) -> AggregateCube:
+        """
+        The debits and credits added up by account, month and tag.
+        """
+
+        return AggregateCube.from_processor(self)
 
-    def save(self, filename: Optional[str] = None) -> None:
+    def cube_filename(self) -> str:
         """
-        Save the processed GL report to a file.
+        Where the cube goes: next to the report, whatever the processed
+        report was saved as.
+        """
+
+        return self.filename.replace(".txt", "_cube.json")
+
+    def save_json(self, filename: Optional[str] = None) -> None:
+        """
+        Save the processed GL report to a JSON file.
         """
 
         if not filename:
@@ -87,7 +436,7 @@ class GLProcessor:
 
         results = {
             "Transactions": t,
-            "Monthly Totals": self.monthly_totals,
+            "Monthly Totals": self.all_monthly_totals(),
             "Balance Forward": self.balances,
             "Valid": self.valid,
         }
@@ -95,28 +444,41 @@ class GLProcessor:
         with open(filename, "w") as f:
             json.dump(results, f, indent=4, default=float)
 
+    def record(self, header: str, transaction: Transaction) -> None:
+        """
+        Add a parsed transaction under the given header.
+        While streaming, it's passed on instead of kept.
+        """
+
+        if self.events is not None:
+            self.events.append(TransactionEvent(
+                header, transaction, self.page + 1, self.line
+            ))
+            return
+
+        self.transactions[header].append(transaction)
+        self.columns[header].append(transaction)
+
     def process_cash_float(self, location) -> None:
         """
         Process a single cash float entry.
         """
 
         p, l = self.page, self.line
-        if not is_entry(self.pagelines[p][l]):
-            raise ValueError(f"Line {l} of page {p + 1} is not an entry.")
-
-        dt = self.pagelines[p][l][:8]
-        iden = self.pagelines[p][l][8:16]
-        amt, amb = extract_amt(self.pagelines[p][l])
 
         # For some reason these lines always have "GL" or "AP" in them,
         # near the end of the line, so we can use this
         # to determine where the description stops
-        tag = extract_tag(self.pagelines[p][l])
-        desc = self.pagelines[p][l][16:].split(tag)[0].strip()
+        e = tokenize_entry(self.pagelines[p][l], CFLOAT_LAYOUT)
+        if e is None:
+            raise ValueError(f"Line {l} of page {p + 1} is not an entry.")
 
         header = CFLOAT.format(loc=location)
-        self.transactions[header].append(
-            Transaction(dt, iden, amt, tag, amb, desc)
+        self.record(
+            header,
+            Transaction(
+                e.date, e.identifier, e.amt, e.tag, e.ambiguous, e.desc
+            )
         )
 
         self.line += 2
@@ -131,54 +493,35 @@ class GLProcessor:
         """
 
         p, l = self.page, self.line
-        if not is_entry(self.pagelines[p][l]):
-            raise ValueError(f"Line {l} of page {p + 1} is not an entry.")
+        e = tokenize_entry(
+            self.pagelines[p][l], INVENTORY_LAYOUT, (BR1, BR2), skip_cnin=True
+        )
 
-        dt = self.pagelines[p][l][:8]
-        amt, amb = None, None
-        iden, tag = "", ""
+        if e is None:
+            raise ValueError(f"Line {l} of page {p + 1} is not an entry.")
+        elif e.tag not in INVENTORY_LAYOUT:
+            # Huh?
+            raise ValueError(f"Line {l} of page {p + 1} is not recognized.")
+        elif e.cnin:
+            # This is a CNIN entry, and can be ignored.
+            self.line += 1
+            return
+
+        # Inventory lines are weird. PS only shows up in Inventory,
+        # GL only shows up in Purchases, and untagged lines are
+        # broken items with a location instead of a tag.
+        desc = e.desc
         skip = 2
-
-        # Inventory lines are weird.
-        t = extract_tag(self.pagelines[p][l])
-        if t == "PS":
-            # Only shows up in Inventory, not in Purchases
-            iden = self.pagelines[p][l][8:PS_INDEX]
-            desc = self.pagelines[p][l][PS_INDEX:].split("PS")[0].strip()
-            amt, amb = extract_amt(self.pagelines[p][l])
-            tag = "PS"
-        elif t == "AP":
-            iden = self.pagelines[p][l][8:20]
-            desc = self.pagelines[p][l][20:].split("AP")[0].strip()
+        if e.tag == "AP":
             desc += ", " + self.pagelines[p][l + 1].strip()
-            amt, amb = extract_amt(self.pagelines[p][l])
-            tag = "AP"
-        elif t == "GL":
-            # Only shows up in Purchases, not in Inventory
-            iden = self.pagelines[p][l][8:15]
-            desc = self.pagelines[p][l][15:].split("GL")[0].strip()
-            amt, amb = extract_amt(self.pagelines[p][l])
-            tag = "GL"
-        elif t is None:
-            if re.search(r"TC: \dCNIN", self.pagelines[p][l]):
-                # This is a CNIN entry, and can be ignored.
-                self.line += 1
-                return
-
-            iden = self.pagelines[p][l][8:15]
-            tag = location(self.pagelines[p][l], uppercase=True)
-            desc = self.pagelines[p][l][15:].split(tag)[0].strip()
-            g = self.pagelines[p][l].replace(BR1, " ")
-            g = g.replace(BR2, " " * len(BR2))
-
-            amt, amb = extract_amt(g)
+        elif e.tag is None:
             skip = 1
-        else:
-            # Huh?
-            raise ValueError(f"Line {l} of page {p + 1} is not recognized.")
 
-        self.transactions[header].append(
-            Transaction(dt, iden, amt, tag, amb, desc)
+        self.record(
+            header,
+            Transaction(
+                e.date, e.identifier, e.amt, e.source, e.ambiguous, desc
+            )
         )
 
         # So apparently, sometimes the desc can just be non-existent?
@@ -198,87 +541,56 @@ class GLProcessor:
         """
 
         p, l = self.page, self.line
-        if not is_entry(self.pagelines[p][l]):
+        e = tokenize_entry(self.pagelines[p][l], COGS_LAYOUT, (BR2, BR1))
+        if e is None:
             raise ValueError(f"Line {l} of page {p + 1} is not an entry.")
-
-        dt = self.pagelines[p][l][:8]
-        amt, amb = None, None
-        iden = ""
-        skip = 2
+        elif e.tag not in COGS_LAYOUT:
+            # Huh?
+            raise ValueError(f"Line {l} of page {p + 1} is not recognized.")
 
         # Inventory lines are weird.
-        tag = extract_tag(self.pagelines[p][l])
-        if tag == "PS":
-            iden = self.pagelines[p][l][8:PS_INDEX]
-            desc = self.pagelines[p][l][PS_INDEX:].split("PS")[0].strip()
-            amt, amb = extract_amt(self.pagelines[p][l])
-        elif tag == "AP":
-            iden = self.pagelines[p][l][8:20]
-            desc = self.pagelines[p][l][20:].split("AP")[0].strip()
+        desc = e.desc
+        skip = 2
+        if e.tag == "AP":
             desc += ", " + self.pagelines[p][l + 1].strip()
-            amt, amb = extract_amt(self.pagelines[p][l])
-        elif tag == "GL":
-            iden = self.pagelines[p][l][8:17]
-            desc = self.pagelines[p][l][17:].split("GL")[0].strip()
-            amt, amb = extract_amt(self.pagelines[p][l])
-        elif tag is None:
-            iden = self.pagelines[p][l][8:15]
-            tag = location(self.pagelines[p][l], uppercase=True)
-            desc = self.pagelines[p][l][15:].split(tag)[0].strip()
-            g = self.pagelines[p][l].replace(BR2, " ")
-            g = g.replace(BR1, " " * len(BR1))
-
-            amt, amb = extract_amt(g)
+        elif e.tag is None:
             skip = 1
-        else:
-            # Huh?
-            raise ValueError(f"Line {l} of page {p + 1} is not recognized.")
 
-        self.transactions[header].append(
-            Transaction(dt, iden, amt, tag, amb, desc)
+        self.record(
+            header,
+            Transaction(
+                e.date, e.identifier, e.amt, e.source, e.ambiguous, desc
+            )
         )
 
         self.line += skip
 
     def process_due_to_shareholder(self) -> None:
         p, l = self.page, self.line
-        if not is_entry(self.pagelines[p][l]):
+        e = tokenize_entry(
+            self.pagelines[p][l], SHAREHOLDER_LAYOUT, (SH2, SH1)
+        )
+
+        if e is None:
             raise ValueError(f"Line {l} of page {p + 1} is not an entry.")
+        elif e.tag not in SHAREHOLDER_LAYOUT:
+            raise ValueError(f"Line {l} of page {p + 1} is not recognized.")
 
-        dt = self.pagelines[p][l][:8]
-        amt, amb = None, None
-        iden, tag = "", extract_tag(self.pagelines[p][l])
         skip = 2
-        if l + 1 < len(self.pagelines[p]) and is_entry(
-            self.pagelines[p][l + 1]
-        ):
-
+        if l + 1 < len(self.pagelines[p]) and self.kinds[p][l + 1] == ENTRY:
             skip = 1
 
-        tag_dict = {
-            "GL": 16,
-            "AP": 20,
-        }
-
-        if tag is not None:
-            ind = tag_dict[tag]
-            iden = self.pagelines[p][l][8:ind]
-            desc = self.pagelines[p][l][ind:].split(tag)[0].strip()
-            amt, amb = extract_amt(self.pagelines[p][l])
-            if skip == 2:
-                desc += ", " + self.pagelines[p][l + 1].strip()
-        else:
-            iden = self.pagelines[p][l][8:15]
-            tag = location(self.pagelines[p][l], uppercase=True)
-            desc = self.pagelines[p][l][15:].split(tag)[0].strip()
-            g = self.pagelines[p][l].replace(SH2, " ")
-            g = g.replace(SH1, " " * len(SH1))
-
-            amt, amb = extract_amt(g)
+        desc = e.desc
+        if e.tag is None:
             skip = 1
+        elif skip == 2:
+            desc += ", " + self.pagelines[p][l + 1].strip()
 
-        self.transactions[DTSHR].append(
-            Transaction(dt, iden, amt, tag, amb, desc)
+        self.record(
+            DTSHR,
+            Transaction(
+                e.date, e.identifier, e.amt, e.source, e.ambiguous, desc
+            )
         )
 
         self.line += skip
@@ -289,114 +601,101 @@ class GLProcessor:
         """
 
         p, l = self.page, self.line
-        if not is_entry(self.pagelines[p][l]):
+        line = self.pagelines[p][l]
+        layout = GENERIC_LAYOUT
+        if line[8:9].isdigit():
+            layout = GENERIC_DIGIT_LAYOUT
+
+        e = tokenize_entry(line, layout, (BR1, BR2), skip_cnin=True)
+        if e is None:
             raise ValueError(f"Line {l} of page {p + 1} is not an entry.")
 
-        dt = self.pagelines[p][l][:8]
-        amt, amb = extract_amt(self.pagelines[p][l])
-        iden = ""
-        tag = extract_tag(self.pagelines[p][l])
         skip = 2
-        if l + 1 < len(self.pagelines[p]) and is_entry(
-            self.pagelines[p][l + 1]
-        ) and num_spaces_at_start(self.raw_pagelines[p][l + 1]) < 2:
+        if (
+            l + 1 < len(self.pagelines[p])
+            and self.kinds[p][l + 1] == ENTRY
+            and num_spaces_at_start(self.raw_pagelines[p][l + 1]) < 2
+        ):
             skip = 1
 
         # Generic lines typically have two letters in them somewhere
         # that give us some information about how the entry is recorded.
         # These are AP, AR, PS, and GL. We can use this to determine where
         # the description stops, and also other formatting information.
-        if extract_tag(self.pagelines[p][l]) == "AP":
-            iden = self.pagelines[p][l][8:20]
-            desc = self.pagelines[p][l][20:].split("AP")[0].strip()
-            if skip == 2:
-                desc += ", " + self.pagelines[p][l + 1].strip()
-
-        elif extract_tag(self.pagelines[p][l]) == "AR":
-            iden = self.pagelines[p][l][8:15]
-            desc = self.pagelines[p][l][15:].split("AR")[0].strip()
-        elif extract_tag(self.pagelines[p][l]) == "GL":
-            ind = PS_INDEX if self.pagelines[p][l][8].isdigit() else 16
-            iden = self.pagelines[p][l][8:ind]
-            desc = self.pagelines[p][l][ind:].split("GL")[0].strip()
-        elif extract_tag(self.pagelines[p][l]) == "PS":
-            if OVERSHORT in self.pagelines[p][l]:
-                iden = OVERSHORT
-                n = self.pagelines[p][l].find(OVERSHORT) + len(OVERSHORT)
-                desc = self.pagelines[p][l][n:].split("PS")[0].strip()
-            else:
-                iden = self.pagelines[p][l][8:PS_INDEX]
-                desc = self.pagelines[p][l][PS_INDEX:].split("PS")[0].strip()
-
-        elif extract_tag(self.pagelines[p][l]) == "PR":
-            iden = self.pagelines[p][l][8:15]
-            desc = self.pagelines[p][l][15:].split("PR")[0].strip()
+        iden, desc = e.identifier, e.desc
+        if e.tag in ("AP", "PR"):
             if skip == 2:
                 desc += ", " + self.pagelines[p][l + 1].strip()
 
-        elif "IN" in self.pagelines[p][l].split()[-1]:
-            if re.search(r"TC: \dCNIN", self.pagelines[p][l]):
+        elif e.tag == "PS" and OVERSHORT in line:
+            iden = OVERSHORT
+            n = line.find(OVERSHORT) + len(OVERSHORT)
+            desc = line[n:].split("PS")[0].strip()
+        elif e.tag is None and "IN" in line.rsplit(None, 1)[-1]:
+            if e.cnin:
                 # This is a CNIN entry, and can be ignored.
                 self.line += 1
                 return
 
-            iden = self.pagelines[p][l][8:15]
-            tag = location(self.pagelines[p][l], uppercase=True)
-            desc = self.pagelines[p][l][15:].split(tag)[0].strip()
-            g = self.pagelines[p][l].replace(BR1, " ")
-            g = g.replace(BR2, " " * len(BR2))
-
-            amt, amb = extract_amt(g)
             skip = 1
-        else:
-            print("Line: " + self.pagelines[p][l])
+        elif e.tag is None:
+            print("Line: " + line)
             raise ValueError(f"Line {l} of page {p + 1} has an unknown tag.")
 
-        self.transactions[header].append(
-            Transaction(dt, iden, amt, tag, amb, desc)
+        self.record(
+            header,
+            Transaction(e.date, iden, e.amt, e.source, e.ambiguous, desc)
         )
 
         self.line += skip
 
+    def check_month(self, header: str, month: str) -> bool:
+        """
+        Compare one month of an account with its totals, using the sums
+        kept as transactions are recorded, and note whether it's valid.
+        """
+
+        deb, cred = self.columns[header].sums[MONTHS[month]]
+        tdeb, tcred = self.monthly_totals[header][month]
+        tdeb, tcred = to_cents(tdeb), to_cents(tcred)
+        valid = (deb == tdeb and cred == tcred) or (
+            header == INVENT and deb - cred == tdeb - tcred
+        )
+
+        self.valid[header][month] = valid
+        return valid
+
     def validate(self) -> None:
         """
         Validates the processed GL report by comparing the
         transaction amounts to the known monthly totals,
         storing the results of comparison in self.valid.
+
+        Months are already checked as their totals are read (see
+        line_loop), so this doesn't go through the transactions again;
+        it just makes sure every month has been checked with everything
+        in, and checks the balances.
         """
 
         for header in self.transactions:
-            calculations = {month: [0, 0] for month in MONTHS}
-            header_total = [0, 0]
-            for transaction in self.transactions[header]:
-                m = MONTH_INDICES[transaction.to_datetime().month]
-                calculations[m][0] += transaction.debit
-                calculations[m][1] += transaction.credit
-
             for month in MONTHS:
-                header_total[0] += self.monthly_totals[header][month][0]
-                header_total[1] += self.monthly_totals[header][month][1]
-                if calculations[month] == self.monthly_totals[header][month]:
-                    self.valid[header][month] = True
-                elif header == INVENT:
-                    t_diff = calculations[month][0] - calculations[month][1]
-                    m_diff = (
-                        self.monthly_totals[header][month][0]
-                        - self.monthly_totals[header][month][1]
-                    )
-                    self.valid[header][month] = t_diff == m_diff
-                else:
-                    self.valid[header][month] = False
+                self.check_month(header, month)
 
-            self.valid[header][ALL] = (
-                self.balances[header] == header_total
-            )
+            totals = cents_table(self.monthly_totals[header])
+            balance = [to_cents(x) for x in self.balances[header]]
+            self.valid[header][ALL] = balance == totals.sum(axis=0).tolist()
 
         # Also check the totals over all headers
-        debs = sum(self.balances[h][0] for h in self.balances)
-        creds = sum(self.balances[h][1] for h in self.balances)
-        print((debs, creds), self.totals)
-        self.valid[ALL] = (debs, creds) == self.totals
+        balances = np.array(
+            [[to_cents(x) for x in self.balances[h]] for h in self.balances],
+            dtype=np.int64
+        ).reshape(-1, 2)
+        debs, creds = balances.sum(axis=0).tolist()
+        print((debs / 100, creds / 100), self.totals)
+        self.valid[ALL] = (
+            len(self.totals) == 2
+            and [debs, creds] == [to_cents(x) for x in self.totals]
+        )
 
     @property
     def all_valid(self) -> bool:
@@ -418,174 +717,1098 @@ class GLProcessor:
 
         return valid
 
+    def ambiguous_amounts(
+        self, header: str, month: str
+    ) -> Tuple[List[int], List[int], int, int]:
+        """
+        Pull out what disambiguation needs for one header and month:
+        the indices of the ambiguous transactions, their amounts in cents,
+        and the debit and credit totals (in cents) that the ambiguous
+        amounts have to make up once the unambiguous ones are taken out.
+        """
+
+        cols = self.columns[header]
+        in_month = cols.month == MONTHS[month]
+        amb = in_month & cols.ambiguous
+        sure = cols.cents[in_month & ~amb]
+
+        deb = to_cents(self.monthly_totals[header][month][0])
+        cred = to_cents(self.monthly_totals[header][month][1])
+        deb -= int(sure[sure > 0].sum())
+        cred += int(sure[sure < 0].sum())
+
+        amb_indices = np.flatnonzero(amb).tolist()
+        return amb_indices, cols.cents[amb].tolist(), deb, cred
+
+    def apply_signs(
+        self,
+        header: str,
+        month: str,
+        amb_indices: List[int],
+        signs: List[int],
+        matches: int = 1
+    ) -> None:
+        """
+        Flip the ambiguous transactions to the signs that were picked,
+        and mark the month as valid.
+        """
+
+        if matches > 1:
+            print(
+                f"Warning: more than one assignment matches {header} "
+                f"for {month}, using the first one found."
+            )
+
+        for i, s in zip(amb_indices, signs):
+            t = self.transactions[header][i]
+            if t.cents * s < 0:
+                self.transactions[header][i] = -t
+                self.columns[header].set_cents(i, -t.cents)
+
+        self.valid[header][month] = True
+
     def disambiguate(self, header: str, month: str) -> None:
         """
         Attempts to use ambiguity values in transactions to
         disambiguate between debit and credit entries,
         where the values cannot be determined from indentation.
-        To do this, it loops through all possible permutations
-        of entries and compares them against the monthly totals,
+        To do this, it takes out the entries we're sure about and
+        looks for the subset of ambiguous amounts that makes up
+        the rest of the monthly debits (see solve_signs),
         saving the disambiguated results once identified.
 
-        NOTE: This procedure assumes that there is one and only one
-        correct permutation that matches the monthly totals.
-        This is unlikely to be true in general, but I have no idea
-        how to solve the general problem with the knowledge I am
-        in possession of.
-        """
-
-        deb = Decimal(self.monthly_totals[header][month][0])
-        cred = Decimal(self.monthly_totals[header][month][1])
-        if not self.valid[header][month]:
-            # How many ambiguous values are there?
-            amb_indices = [
-                i
-                for i, v in enumerate(self.transactions[header])
-                if v.to_datetime().month == MONTHS[month] and v.ambiguous
-            ]
+        NOTE: More than one assignment can match the monthly totals.
+        If that happens, the first one found is used and a warning
+        is printed, since there's no way to tell them apart.
+        """
 
-            for t in self.transactions[header]:
-                if t.to_datetime().month == MONTHS[month] and not t.ambiguous:
-                    deb -= t.debit
-                    cred -= t.credit
-
-            n = len(amb_indices)
-            ambs = [self.transactions[header][i] for i in amb_indices]
-            perms = itertools.product([-1, 1], repeat=n)
-            for perm in tqdm(perms, total=2**n):
-                ambs_copy = ambs.copy()
-                for i, v in enumerate(perm):
-                    ambs_copy[i] *= v
-
-                tdeb = sum(t.debit for t in ambs_copy)
-                tcred = sum(t.credit for t in ambs_copy)
-                if (tdeb == deb and tcred == cred) or (
-                    header == INVENT and tdeb - tcred == deb - cred
-                ):
-                    self.valid[header][month] = True
-                    for j, t in enumerate(ambs_copy):
-                        self.transactions[header][amb_indices[j]] = t
+        if self.valid[header][month]:
+            return
+
+        amb_indices, amts, deb, cred = self.ambiguous_amounts(header, month)
+        signs, matches = self.solve(header, month, amts, deb, cred)
+
+        if signs is None:
+            tlen = len(self.transactions[header])
+            raise ValueError(
+                f"Could not disambiguate {header} for {month}. "
+                f"Without the unambiguous entries, the totals are "
+                f"{deb / 100:.2f} and {cred / 100:.2f}, "
+                f"but no choice of signs for the ambiguous amounts "
+                f"adds up to them. "
+                f"There are {tlen} transactions in total, "
+                f"and the ambiguous amounts are: "
+                f"{[abs(a) / 100 for a in amts]}."
+            )
 
-                    break
-            else:
-                tlen = len(self.transactions[header])
-                amts = [abs(float(t.amt)) for t in ambs]
-                raise ValueError(
-                    f"Could not disambiguate {header} for {month}. "
-                    f"The correct totals are {deb} and {cred}, "
-                    f"but the calculated totals are {tdeb} and {tcred}. "
-                    f"There are {tlen} transactions in total, "
-                    f"and the ambiguous amounts are: {amts}."
-                )
+        self.apply_signs(header, month, amb_indices, signs, matches)
+
+    def signs_key(
+        self, header: str, month: str, amts: List[int], deb: int, cred: int
+    ) -> Tuple[str, List[int]]:
+        """
+        What the solution for a month is cached under: a hash of the
+        header, month, targets and ambiguous amounts, with the amounts
+        sorted so that it doesn't matter what order they come in.
+        Also returns that order, to put the signs back in.
+        """
+
+        order = sorted(range(len(amts)), key=lambda i: abs(amts[i]))
+        h = hashlib.sha256(
+            f"{SIGNS_CACHE_VERSION}|{header}|{month}|{deb}|{cred}|".encode()
+        )
+        h.update(",".join(str(abs(amts[i])) for i in order).encode())
+        return h.hexdigest(), order
+
+    def cached_signs(
+        self, header: str, month: str, amts: List[int], deb: int, cred: int
+    ) -> Optional[Tuple[List[int], int]]:
+        """
+        The signs (and number of matches) this month was solved with
+        before, if the cache has them.
+        """
+
+        if self.cache is None:
+            return None
+
+        key, order = self.signs_key(header, month, amts, deb, cred)
+        hit = self.cache.get(key)
+        if hit is None:
+            return None
+
+        if self.instruments is not None:
+            self.instruments.count("cached solutions")
+
+        sorted_signs, matches = hit
+        signs = [0] * len(amts)
+        for i, s in zip(order, sorted_signs):
+            signs[i] = s
+
+        return signs, matches
+
+    def cache_signs(
+        self,
+        header: str,
+        month: str,
+        amts: List[int],
+        deb: int,
+        cred: int,
+        signs: List[int],
+        matches: int
+    ) -> None:
+        if self.cache is None:
+            return
+
+        key, order = self.signs_key(header, month, amts, deb, cred)
+        self.cache.put(key, ([signs[i] for i in order], matches))
+
+    def solve(
+        self, header: str, month: str, amts: List[int], deb: int, cred: int
+    ) -> Tuple[Optional[List[int]], int]:
+        """
+        solve_signs for a month, unless it's been solved before.
+        """
+
+        hit = self.cached_signs(header, month, amts, deb, cred)
+        if hit is not None:
+            return hit
+
+        signs, matches = solve_signs(amts, deb, cred, net=header == INVENT)
+        if signs is not None:
+            self.cache_signs(header, month, amts, deb, cred, signs, matches)
+
+        return signs, matches
+
+    def disambiguate_parallel(
+        self,
+        workers: Optional[int] = None,
+        timeout: Optional[float] = None
+    ) -> List[Tuple[str, str, str]]:
+        """
+        Disambiguate every invalid (header, month) pair at the same time,
+        each one in its own worker process (see DisambiguationPool).
+        Pairs that can't be solved, or take longer than `timeout` seconds,
+        are left invalid instead of stopping the run.
+
+        Returns the failures as (header, month, reason), and prints them.
+
+        If process started disambiguating months while parsing, those
+        are picked up from where they are, unless what they were
+        started with has changed since. Months solved in an earlier run
+        come straight out of the cache, without a worker.
+        """
+
+        pool = self.eager or DisambiguationPool(workers, timeout)
+        self.eager = None
+        wanted = []
+        for h in self.transactions:
+            for m in MONTHS:
+                if self.valid[h][m]:
+                    continue
+
+                print(f"Disambiguating {h} for {m}")
+                self.submit_month(pool, h, m)
+                wanted.append((h, m))
+
+        # Anything started while parsing that turned out fine after all
+        for key in set(self.jobs) - set(wanted):
+            pool.cancel(key)
+
+        for h, m in wanted:
+            if (h, m) in self.solved:
+                self.apply_job(h, m, *self.solved[h, m])
+
+        failures = []
+        try:
+            running = len(wanted) - len(self.solved.keys() & set(wanted))
+            for result in tqdm(pool.results(), total=running):
+                h, m = result.key
+                amb_indices, amts, deb, cred = self.jobs[h, m]
+                if result.ok:
+                    self.cache_signs(
+                        h, m, amts, deb, cred, result.signs, result.matches
+                    )
+                    self.apply_job(h, m, result.signs, result.matches)
+                else:
+                    reason = result.error or "no assignment matches the totals"
+                    failures.append((h, m, reason))
+        finally:
+            pool.close()
+            self.jobs = {}
+            self.solved = {}
+
+        if failures:
+            print(f"Could not disambiguate {len(failures)} month(s):")
+            for h, m, reason in failures:
+                print(f"    {h} for {m}: {reason}")
+
+        return failures
+
+    def apply_job(
+        self, header: str, month: str, signs: List[int], matches: int
+    ) -> None:
+        """
+        apply_signs for a month solved through submit_month.
+        """
+
+        amb_indices = self.jobs[header, month][0]
+        self.apply_signs(header, month, amb_indices, signs, matches)
+
+    def submit_month(
+        self, pool: DisambiguationPool, header: str, month: str
+    ) -> None:
+        """
+        Start disambiguating a month in the pool, unless it's already
+        going with the same amounts and totals. If they've changed,
+        the old job is dropped. If the cache has the answer, it goes
+        in self.solved instead.
+        """
+
+        job = self.ambiguous_amounts(header, month)
+        old = self.jobs.get((header, month))
+        if old == job:
+            return
+        elif old is not None:
+            pool.cancel((header, month))
+            self.solved.pop((header, month), None)
+
+        self.jobs[header, month] = job
+        amb_indices, amts, deb, cred = job
+        hit = self.cached_signs(header, month, amts, deb, cred)
+        if hit is not None:
+            self.solved[header, month] = hit
+            return
+
+        pool.submit((header, month), amts, deb, cred, net=header == INVENT)
 
     def line_loop(self) -> None:
         """
         Iterate over the lines of a page, and add entries accordingly.
+        What each line is was already worked out by classify_lines.
+
+        If this processor isn't strict, a line that can't be parsed
+        is noted as a diagnostic instead, and parsing picks up again
+        from the next line it can make sense of (see resync).
         """
 
         self.line = 8
+        self.page_headers = []
         p = self.page
-        while self.line < len(self.pagelines[p]):
-            x = self.pagelines[p][self.line].split(" " * 10)[0]
-            if x == "Totals for Report":
-                self.line += 2
-                self.totals = extract_balances(self.pagelines[p][self.line])
-                return
+        lines, kinds = self.pagelines[p], self.kinds[p]
+        instr = self.instruments
+        while self.line < len(lines):
+            start = self.line
+            try:
+                if kinds[self.line] == REPORT_TOTAL:
+                    self.line += 2
+                    self.totals = extract_balances(lines[self.line])
+                    return
+
+                x = lines[self.line].split(" " * 10)[0]
+                num, header = x.split(" " * 4)
+            except Exception as e:
+                if self.strict:
+                    raise
+
+                self.diagnose(start, e)
+                self.resync(start, None)
+                continue
 
-            num, header = x.split(" " * 4)
             if header is None:
                 return
             elif header not in self.header_numbers:
                 self.header_numbers[header] = num
 
+            self.page_headers.append(header)
+
+            if header not in self.transactions and header in HEADERS:
+                self.add_account(header)
+            elif header not in HEADERS and not self.strict:
+                # Every line under it would fail the same way, so say so
+                # once and skip to the next account. Strict runs still
+                # fail on its first entry.
+                self.diagnose(
+                    start, ValueError(f"unknown account {header}"), header
+                )
+                self.resync(start, None)
+                continue
+
             self.line += 2
-            while self.line < len(self.pagelines[p]):
-                if is_entry(self.pagelines[p][self.line]):
-                    self.headers[header]()
-                elif totfor(self.pagelines[p][self.line]):
-                    month = extract_month(self.pagelines[p][self.line])
-                    deb, cred = extract_totals(self.pagelines[p][self.line])
-                    self.monthly_totals[header][month][0] += deb
-                    self.monthly_totals[header][month][1] += cred
-                    self.line += 1
-                elif balfor(self.pagelines[p][self.line]):
-                    self.line += 1
-                    deb, cred = extract_balances(self.pagelines[p][self.line])
-                    op, clos = extract_balance_forwards(
-                        self.pagelines[p][self.line]
-                    )
+            while self.line < len(lines):
+                start = self.line
+                kind = kinds[start]
+                try:
+                    if kind == ENTRY:
+                        if instr is None:
+                            self.handlers[header]()
+                        else:
+                            self.timed_entry(header)
+                    elif kind == MONTH_TOTAL:
+                        month = extract_month(lines[self.line])
+                        deb, cred = extract_totals(lines[self.line])
+                        self.monthly_totals[header][month][0] += deb
+                        self.monthly_totals[header][month][1] += cred
+                        if self.events is not None:
+                            self.events.append(MonthTotalEvent(
+                                header, month, deb, cred, p + 1, start
+                            ))
+                        elif (
+                            not self.check_month(header, month)
+                            and self.eager is not None
+                        ):
+                            self.submit_month(self.eager, header, month)
+
+                        self.line += 1
+                    elif kind == BALANCE_FORWARD:
+                        self.line += 1
+                        deb, cred = extract_balances(lines[self.line])
+                        op, clos = extract_balance_forwards(lines[self.line])
+
+                        opt = Transaction(
+                            f"01/01/{self.yr % 100}",
+                            "",
+                            op,
+                            "",
+                            desc="Balance Forward"
+                        )
+
+                        clost = Transaction(
+                            f"12/31/{self.yr % 100}",
+                            "",
+                            clos,
+                            "",
+                            desc="Ending Balance"
+                        )
+
+                        self.balances[header] = [deb, cred]
+                        self.balance_forwards[header] = [opt, clost]
+                        if self.events is not None:
+                            self.events.append(BalanceForwardEvent(
+                                header, opt, clost, deb, cred, p + 1, start
+                            ))
+
+                        self.line += 2
+                        break
+                    else:
+                        # ???
+                        raise ValueError(
+                            f"Line {self.line} of page {self.page + 1}, "
+                            f"{lines[self.line]}, "
+                            "is not recognized."
+                        )
+                except Exception as e:
+                    if self.strict:
+                        raise
+
+                    self.diagnose(start, e, header)
+                    if not self.resync(start, header):
+                        break
+
+    def diagnose(
+        self, line: int, error: Exception, header: Optional[str] = None
+    ) -> None:
+        """
+        Note that a line of the current page couldn't be parsed.
+        """
 
-                    opt = Transaction(
-                        f"01/01/{self.yr % 100}",
-                        "",
-                        op,
-                        "",
-                        desc="Balance Forward"
-                    )
+        lines = self.pagelines[self.page]
+        d = Diagnostic(
+            str(error) or type(error).__name__,
+            self.page + 1,
+            line,
+            lines[line] if line < len(lines) else None,
+            header,
+        )
+        if self.add_diagnostic(d) and self.events is not None:
+            self.events.append(d)
 
-                    clost = Transaction(
-                        f"12/31/{self.yr % 100}",
-                        "",
-                        clos,
-                        "",
-                        desc="Ending Balance"
-                    )
+    def add_diagnostic(self, d: Diagnostic) -> bool:
+        """
+        Add a diagnostic, unless it's about an unknown account that's
+        already been reported (its header shows up again on every page
+        it runs over). Returns whether it was added.
+        """
 
-                    self.balances[header] = [deb, cred]
-                    self.balance_forwards[header] = [opt, clost]
-                    self.line += 2
-                    break
-                else:
-                    # ???
-                    raise ValueError(
-                        f"Line {self.line} of page {self.page + 1}, "
-                        f"{self.pagelines[p][self.line]}, "
-                        "is not recognized."
+        if d.message == f"unknown account {d.account}":
+            if d.account in self.unknown_accounts:
+                return False
+
+            self.unknown_accounts.add(d.account)
+
+        self.diagnostics.append(d)
+        return True
+
+    def resync(self, line: int, header: Optional[str]) -> bool:
+        """
+        After a bad line, skip ahead to the next line that parsing can
+        pick up from. Within an account (if header is given), that's
+        its next entry, month total or Balance Forward, and this returns
+        True. Otherwise it's the next account header (of an account
+        we know) or the report totals, and this returns False.
+        """
+
+        p = self.page
+        lines, kinds = self.pagelines[p], self.kinds[p]
+        for l in range(line + 1, len(lines)):
+            kind = kinds[l]
+            if header is not None and kind in (
+                ENTRY, MONTH_TOTAL, BALANCE_FORWARD
+            ):
+                self.line = l
+                return True
+            elif kind == REPORT_TOTAL:
+                self.line = l
+                return False
+            elif kind == ACCOUNT_HEADER:
+                parts = lines[l].split(" " * 10)[0].split(" " * 4)
+                if len(parts) == 2 and parts[1] in HEADERS:
+                    self.line = l
+                    return False
+
+        self.line = len(lines)
+        return False
+
+    def iter_transactions(self, totals: bool = True) -> Iterator[Event]:
+        """
+        Parse the report from the start, yielding transactions (with
+        their header, page and line) as they're found, along with the
+        month totals and Balance Forwards (unless totals=False), and
+        in a tolerant run, any Diagnostics.
+
+        This goes through the same handlers as parse, but nothing is
+        kept: self.transactions stays empty, so a report of any size can
+        be streamed into something else. The small stuff (header numbers,
+        monthly totals, balances, report totals) is kept as usual.
+        Events come out a page at a time, right after it's parsed.
+        """
+
+        self.reset()
+        self.events = []
+        try:
+            for p in range(len(self.pagelines)):
+                self.page = p
+                self.line_loop()
+                self.store.release(p)
+                for event in self.events:
+                    if totals or isinstance(event, TransactionEvent):
+                        yield event
+
+                self.events.clear()
+        finally:
+            self.events = None
+
+    def timed_entry(self, header: str) -> None:
+        """
+        Process an entry like line_loop would, but
+        tell the instruments how long it took.
+        """
+
+        line = self.line
+        t = time.perf_counter()
+        self.handlers[header]()
+        self.instruments.handler(
+            header,
+            HEADERS[header].handler,
+            time.perf_counter() - t,
+            self.line - line
+        )
+
+    def parse_result(self, error: Optional[Exception] = None) -> ParseResult:
+        """
+        Everything parsing has added so far, for headers that showed up.
+        """
+
+        seen = self.header_numbers
+        return ParseResult(
+            {h: t for h, t in self.transactions.items() if t},
+            self.monthly_totals,
+            self.balances,
+            self.balance_forwards,
+            seen,
+            self.totals,
+            error,
+            self.page,
+            self.line,
+            self.instruments,
+            self.diagnostics,
+        )
+
+    def merge(self, result: ParseResult) -> None:
+        """
+        Add the results of parsing a run of pages, as if they'd
+        been parsed here, right after the pages parsed so far.
+        """
+
+        if result.error is not None:
+            self.page, self.line = result.page, result.line
+            raise result.error
+
+        if self.instruments is not None and result.instruments is not None:
+            self.instruments.merge(result.instruments)
+
+        for header in result.header_numbers:
+            if header not in self.transactions and header in HEADERS:
+                self.add_account(header)
+
+        for header, transactions in result.transactions.items():
+            if self.events is None:
+                self.transactions[header].extend(transactions)
+                self.columns[header].extend(transactions)
+                continue
+
+            for transaction in transactions:
+                self.record(header, transaction)
+
+        for header, months in result.monthly_totals.items():
+            for month, (deb, cred) in months.items():
+                self.monthly_totals[header][month][0] += deb
+                self.monthly_totals[header][month][1] += cred
+
+                # Same as reading the totals in line_loop
+                if (
+                    (deb or cred)
+                    and not self.check_month(header, month)
+                    and self.eager is not None
+                ):
+                    self.submit_month(self.eager, header, month)
+
+        self.balances.update(result.balances)
+        self.balance_forwards.update(result.balance_forwards)
+        for header, num in result.header_numbers.items():
+            self.header_numbers.setdefault(header, num)
+
+        if result.totals:
+            self.totals = result.totals
+
+        for d in result.diagnostics:
+            self.add_diagnostic(d)
+
+    def page_key(self, p: int) -> str:
+        """
+        What page p is cached under: a hash of its text, plus whatever
+        else changes what parsing it gives.
+        """
+
+        h = hashlib.sha256(
+            f"{PAGE_CACHE_VERSION}|{self.yr}|{self.store.encoding}|".encode()
+        )
+        h.update(self.store.data(p))
+        return h.hexdigest()
+
+    def parse_page(self, p: int) -> ParseResult:
+        """
+        Parse page p on its own, without touching what's been parsed here.
+        """
+
+        if self.scratch is None:
+            self.scratch = GLProcessor(
+                self.filename, self.yr, strict=self.strict
+            )
+
+        s = self.scratch
+        s.reset()
+        s.page = p
+        s.instruments = None if self.instruments is None else Instruments()
+        try:
+            s.line_loop()
+        except Exception as e:
+            return s.parse_result(error=e)
+        finally:
+            s.store.release(p)
+
+        return s.parse_result()
+
+    def parse_by_page(self, workers: int = 1, start: int = 0) -> None:
+        """
+        Parse the pages of the report from `start` on one at a time,
+        merging each one in as soon as it and the ones before it are in.
+        This is what parse does when there's a cache.
+        Pages that haven't changed come from the cache (if there is
+        one) and the rest are cached, and every page goes into the
+        checkpoint (if there is one) once it's merged.
+        """
+
+        n = len(self.pagelines)
+        pages = range(start, n)
+        keys: Dict[int, str] = {}
+        results: Dict[int, ParseResult] = {}
+        if self.cache is not None:
+            for p in pages:
+                keys[p] = self.page_key(p)
+                result = self.cache.get(keys[p])
+                if result is not None:
+                    results[p] = result
+
+            print(
+                f"Page cache: {len(results)} of {len(pages)} pages "
+                f"already parsed"
+            )
+            if self.instruments is not None:
+                self.instruments.count("cached pages", len(results))
+
+        misses = [p for p in pages if p not in results]
+        missed = set(misses)
+        chunks = min(workers * 4, len(misses) // MIN_CHUNK_PAGES)
+        pool = None
+        if workers <= 1 or chunks <= 1:
+            runs = iter([p] for p in misses)
+            parsed = ([self.parse_page(p)] for p in misses)
+        else:
+            # Runs of pages are parsed in the workers, and come back in order
+            bounds = [len(misses) * i // chunks for i in range(chunks + 1)]
+            run_list = [misses[a:b] for a, b in zip(bounds, bounds[1:])]
+            runs = iter(run_list)
+            pool = ProcessPoolExecutor(workers)
+            parsed = pool.map(
+                parse_each_page,
+                [self.filename] * chunks,
+                [self.yr] * chunks,
+                run_list,
+                [self.instruments is not None] * chunks,
+                [self.strict] * chunks,
+            )
+
+        # With a cache, keep going past a bad page so that the pages
+        # after it are cached for the next run, then raise at the end
+        failed = None
+        try:
+            for p in tqdm(pages):
+                while p not in results:
+                    results.update(zip(next(runs), next(parsed)))
+
+                result = results.pop(p)
+                # Pages with problems are parsed again every time,
+                # so that they're reported every time
+                if (
+                    self.cache is not None and p in missed
+                    and result.error is None and not result.diagnostics
+                ):
+                    # Nothing's timed when a page comes out of the cache
+                    self.cache.put(keys[p], result._replace(instruments=None))
+
+                if failed is not None:
+                    continue
+                elif result.error is not None:
+                    failed = result
+                    if self.cache is None:
+                        break
+
+                    continue
+
+                before = None
+                if self.checkpoint is not None:
+                    before = self.checkpoint_state()
+
+                self.merge(result)
+                if before is not None:
+                    self.checkpoint_pages(p, 1, before, result.header_numbers)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        if self.cache is not None:
+            self.cache.evict()
+
+        if failed is not None:
+            self.merge(failed)
+
+    def checkpoint_state(self) -> Tuple[Dict[str, int], int]:
+        """
+        How many transactions (by header) and diagnostics there are so
+        far, for checkpoint_pages to tell what the next pages added.
+        """
+
+        return (
+            {h: len(ts) for h, ts in self.transactions.items()},
+            len(self.diagnostics)
+        )
+
+    def checkpoint_pages(
+        self,
+        page: int,
+        pages: int,
+        before: Tuple[Dict[str, int], int],
+        headers: Iterable[str]
+    ) -> None:
+        """
+        Add `pages` pages from `page` on to the checkpoint, now that
+        they've been parsed: the transactions and diagnostics they added
+        since `before` (see checkpoint_state), and where the monthly
+        totals and balances of the accounts in them (`headers`) are up to.
+
+        Transactions are saved as rows (see Transaction.to_row), so
+        resuming doesn't have to parse their dates and amounts again.
+        """
+
+        lens, diagnostics = before
+        record: Dict[str, Any] = {
+            "page": page,
+            "pages": pages,
+            "header_numbers": {},
+            "transactions": {},
+            "monthly_totals": {},
+            "balances": {},
+            "balance_forwards": {},
+        }
+        for h in dict.fromkeys(headers):
+            record["header_numbers"][h] = self.header_numbers[h]
+            if h not in self.transactions:
+                continue
+
+            n = lens.get(h, 0)
+            if len(self.transactions[h]) > n:
+                record["transactions"][h] = [
+                    t.to_row() for t in self.transactions[h][n:]
+                ]
+
+            record["monthly_totals"][h] = {
+                m: [str(x) for x in v]
+                for m, v in self.monthly_totals[h].items() if any(v)
+            }
+            if h in self.balances:
+                record["balances"][h] = [str(x) for x in self.balances[h]]
+                record["balance_forwards"][h] = [
+                    t.to_row() for t in self.balance_forwards[h]
+                ]
+
+        record["totals"] = [str(x) for x in self.totals]
+        record["diagnostics"] = [
+            d._asdict() for d in self.diagnostics[diagnostics:]
+        ]
+        self.checkpoint.write(record)
+
+    def restore(self, record: Dict[str, Any]) -> None:
+        """
+        Put back the pages in a checkpoint record (see checkpoint_pages),
+        as if they'd just been parsed here.
+        """
+
+        for h, num in record["header_numbers"].items():
+            self.header_numbers.setdefault(h, num)
+            if h not in self.transactions and h in HEADERS:
+                self.add_account(h)
+
+        for h, rows in record["transactions"].items():
+            transactions = [Transaction.from_row(r) for r in rows]
+            self.transactions[h].extend(transactions)
+            self.columns[h].extend(transactions)
+
+        for h, months in record["monthly_totals"].items():
+            for m, v in months.items():
+                self.monthly_totals[h][m] = [Decimal(x) for x in v]
+
+                # Same as reading the totals in line_loop
+                if not self.check_month(h, m) and self.eager is not None:
+                    self.submit_month(self.eager, h, m)
+
+        for h, v in record["balances"].items():
+            self.balances[h] = [Decimal(x) for x in v]
+            self.balance_forwards[h] = [
+                Transaction.from_row(r) for r in record["balance_forwards"][h]
+            ]
+
+        if record["totals"]:
+            self.totals = tuple(Decimal(x) for x in record["totals"])
+
+        for d in record["diagnostics"]:
+            self.add_diagnostic(Diagnostic(**d))
+
+    def resume(self) -> int:
+        """
+        Start the checkpoint, first putting back the pages it already has
+        if this run is resuming one. Returns the first page to parse.
+        """
+
+        h = hashlib.sha256(
+            f"{PAGE_CACHE_VERSION}|{self.yr}|{self.store.encoding}|"
+            f"{self.strict}|".encode()
+        )
+        h.update(self.store.buffer)
+        key = h.hexdigest()
+
+        records = self.checkpoint.load(key) if self.checkpoint.resume else []
+        for record in tqdm(records):
+            self.restore(record)
+
+        start = sum(record["pages"] for record in records)
+        self.checkpoint.start(key, start)
+        if records:
+            print(
+                f"Resuming from the checkpoint, which has {start} "
+                f"of {len(self.pagelines)} pages"
+            )
+            if self.instruments is not None:
+                self.instruments.count("resumed pages", start)
+
+        return start
+
+    def parse(self, workers: int = 1) -> None:
+        """
+        Parse every page of the report. With more than one worker,
+        runs of pages are parsed in worker processes and merged back
+        in order, which gives exactly what parsing them here would.
+
+        With a checkpoint, parsing starts from wherever it got to
+        (if this run is resuming), and every page (or run of pages,
+        with workers) goes in the checkpoint once it's in.
+        """
+
+        start = 0 if self.checkpoint is None else self.resume()
+        try:
+            if self.cache is not None:
+                self.parse_by_page(workers, start)
+            else:
+                self.parse_from(workers, start)
+        finally:
+            if self.checkpoint is not None:
+                self.checkpoint.close()
+
+    def parse_from(self, workers: int = 1, start: int = 0) -> None:
+        """
+        Parse the pages of the report from `start` on, here or in
+        runs in worker processes (see parse).
+        """
+
+        n = len(self.pagelines)
+        chunks = min(workers * 4, (n - start) // MIN_CHUNK_PAGES)
+        if workers <= 1 or chunks <= 1:
+            for p in trange(start, n):
+                before = None
+                if self.checkpoint is not None:
+                    before = self.checkpoint_state()
+
+                self.page = p
+                self.line_loop()
+                self.store.release(p)
+                if before is not None:
+                    self.checkpoint_pages(p, 1, before, self.page_headers)
+
+            return
+
+        bounds = [start + (n - start) * i // chunks for i in range(chunks + 1)]
+        with ProcessPoolExecutor(workers) as pool:
+            results = pool.map(
+                parse_pages,
+                [self.filename] * chunks,
+                [self.yr] * chunks,
+                bounds[:-1],
+                bounds[1:],
+                [self.instruments is not None] * chunks,
+                [self.strict] * chunks,
+            )
+            for i, result in enumerate(tqdm(results, total=chunks)):
+                before = None
+                if self.checkpoint is not None:
+                    before = self.checkpoint_state()
+
+                self.merge(result)
+                if before is not None:
+                    self.checkpoint_pages(
+                        bounds[i],
+                        bounds[i + 1] - bounds[i],
+                        before,
+                        result.header_numbers
                     )
 
-    def process(self) -> None:
+    def process(
+        self,
+        workers: int = 1,
+        timeout: Optional[float] = None,
+        fmt: str = "json"
+    ) -> None:
         """
         Process the GL report.
+
+        With more than one worker, pages are parsed in parallel,
+        and invalid months are disambiguated in parallel. Months that
+        can't be disambiguated stop a strict run, like they do one at a
+        time, unless there's a timeout: then any that fail (or take
+        longer than `timeout` seconds) are reported instead. A timeout
+        with just the one worker does the same, one month at a time,
+        since the only way to stop a solve that's taking too long is to
+        run it in its own process.
+
+        The results are saved (see save) in the given format,
+        along with the instrumentation report if there is one.
         """
 
-        for p in trange(len(self.pagelines)):
-            self.page = p
-            self.line_loop()
+        # With workers to spare, months that don't add up are handed
+        # to them as soon as their totals are read, while parsing goes on
+        if workers > 1:
+            self.eager = DisambiguationPool(workers, timeout)
 
-        # Drop all headers with no transactions
+        with self.stage("parse"):
+            try:
+                self.parse(workers)
+            except BaseException:
+                if self.eager is not None:
+                    self.eager.close()
+                    self.eager = None
+
+                raise
+
+        # Drop all headers with no transactions, and put the rest back
+        # in the usual order, whatever order they showed up in
         self.transactions = {
-            k: v for k, v in self.transactions.items() if len(v) > 0
+            h: self.transactions[h] for h in HEADERS
+            if len(self.transactions.get(h, [])) > 0
         }
 
-        self.valid = {
-            k: v for k, v in self.valid.items() if k in self.transactions
-        }
+        # Can't check (or save) an account without its Balance Forward,
+        # which only happens in a tolerant run if that part was bad
+        for h in [h for h in self.transactions if h not in self.balances]:
+            self.diagnostics.append(Diagnostic(
+                "No Balance Forward, so the account was left out.",
+                account=h
+            ))
+            del self.transactions[h]
+
+        self.valid = {h: self.valid[h] for h in self.transactions}
 
         for h in self.transactions:
             print(f"{h}: {len(self.transactions[h])} transactions")
             print(f"Balance Forward: {self.balances[h]}" + "\n")
 
-        self.validate()
-        self.save()
-        if not self.all_valid:
-            for h in self.transactions:
-                for m in MONTHS:
-                    if not self.valid[h][m]:
+        with self.stage("validate"):
+            self.validate()
+
+        # Saved as is in case disambiguating doesn't finish, but the cube
+        # and the search index can wait for the final save
+        with self.stage("save"):
+            self.save(fmt=fmt, cube=False, search=False)
+
+        invalid = sum(
+            not self.valid[h][m] for h in self.transactions for m in MONTHS
+        )
+        failures = []
+        with self.stage("disambiguate"):
+            if not self.all_valid and (workers > 1 or timeout):
+                failures = self.disambiguate_parallel(workers, timeout)
+            elif not self.all_valid:
+                for h in self.transactions:
+                    for m in MONTHS:
+                        if self.valid[h][m]:
+                            continue
+
                         print(f"Disambiguating {h} for {m}")
-                        self.disambiguate(h, m)
+                        try:
+                            self.disambiguate(h, m)
+                        except ValueError as e:
+                            if self.strict:
+                                raise
+
+                            failures.append((h, m, str(e)))
+
+        # Nothing left to do for anything started while parsing
+        if self.eager is not None:
+            self.eager.close()
+            self.eager = None
+            self.jobs = {}
+            self.solved = {}
+
+        # Same as one at a time: only a timeout makes failures reportable
+        if self.strict and failures and not timeout:
+            h, m, reason = failures[0]
+            raise ValueError(f"Could not disambiguate {h} for {m}: {reason}")
+
+        if not self.strict:
+            for h, m, reason in failures:
+                self.diagnostics.append(
+                    Diagnostic(reason, account=h, month=m)
+                )
 
         print(self.all_valid)
-        self.save()
+        with self.stage("save"):
+            self.save(fmt=fmt)
+
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
+
+        if self.instruments is not None:
+            self.instruments.count("pages", len(self.pagelines))
+            self.instruments.count(
+                "transactions",
+                sum(len(ts) for ts in self.transactions.values())
+            )
+            self.instruments.count("months disambiguated", invalid)
+            self.instruments.count("failures", len(failures))
+            self.instruments.count("diagnostics", len(self.diagnostics))
+            if self.cache is not None:
+                self.instruments.count("cache hits", self.cache.hits)
+                self.instruments.count("cache misses", self.cache.misses)
+
+            self.save_instruments()
+
+        if not self.strict:
+            self.report_diagnostics()
+
         print("Done.")
 
-    def save_to_excel(self, filename: Optional[str] = None) -> None:
+    def report_diagnostics(self, filename: Optional[str] = None) -> None:
+        """
+        Print everything that went wrong in a tolerant run, and save it
+        as JSON (by default next to the report), even if it's nothing,
+        so that an old list doesn't hang around after the fix.
+        """
+
+        if not filename:
+            filename = self.filename.replace(".txt", "_diagnostics.json")
+
+        print(f"{len(self.diagnostics)} problem(s):")
+        for d in self.diagnostics:
+            print(f"    {d}")
+
+        with open(filename, "w") as f:
+            json.dump([d._asdict() for d in self.diagnostics], f, indent=4)
+
+    def stage(self, name: str) -> ContextManager[None]:
+        """
+        Time a stage if this run is instrumented, otherwise do nothing.
+        """
+
+        if self.instruments is None:
+            return contextlib.nullcontext()
+
+        return self.instruments.stage(name)
+
+    def save_instruments(self) -> None:
+        """
+        Save the instrumentation report, by default next to the report.
+        """
+
+        self.instruments.save(
+            self.instruments.filename
+            or self.filename.replace(".txt", "_instruments.json")
+        )
+
+    def save_to_excel(
+        self, filename: Optional[str] = None, streaming: bool = True
+    ) -> None:
         """
         Save the processed GL report to an Excel file.
+
+        By default the rows are streamed straight into the file
+        (see excel_export), with typed amounts and dates. streaming=False
+        goes through pandas DataFrames instead, like it used to.
+
+        The trial balance is saved next to it, from the cube.
         """
 
         if filename is None:
             filename = self.filename.replace(".txt", ".xlsx")
 
+        self.cube().save_trial_balance(
+            os.path.splitext(filename)[0] + "_trial_balance.xlsx"
+        )
+        if streaming:
+            with self.stage("excel"):
+                export_excel(self, filename)
+
+            if self.instruments is not None:
+                self.save_instruments()
+
+            return
+
         header_order = sorted(
             self.transactions.keys(),
             key=lambda x: float(self.header_numbers[x])
@@ -616,18 +1839,164 @@ if __name__ == "__main__":
     parser.add_argument(
         "filename",
         type=str,
-        help="The filename of the GL report to process."
+        help="The filename of the GL report to process, or a directory "
+             "(or glob) of reports to process as a batch, one year each."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="How many processes to parse pages and disambiguate months "
+             "with (1, the default, to do everything in this one), or for "
+             "a batch, how many reports to do at once (default: one per "
+             "CPU)."
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Give up on disambiguating a month after this many seconds, "
+             "and report it instead of stopping (even with --workers 1). "
+             "Months with over about 50 ambiguous amounts and no answer "
+             "can take minutes."
+    )
+    parser.add_argument(
+        "--format",
+        choices=["json", "sqlite"],
+        default="json",
+        help="Save the processed report as JSON or as a SQLite database."
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse every page, without reading or writing the page cache."
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Where to keep parsed pages (default: .gl_cache next to the "
+             "report)."
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=float,
+        default=DEFAULT_MAX_BYTES / 2**20,
+        help="Evict the least recently used pages past this many MB."
+    )
+    parser.add_argument(
+        "--cache-age",
+        type=float,
+        default=DEFAULT_MAX_AGE / 86400,
+        help="Evict pages that haven't been used in this many days."
+    )
+
+    parser.add_argument(
+        "--search-index",
+        type=str,
+        default=None,
+        help="Where to keep the full-text search index (default: "
+             ".gl_search next to the report)."
+    )
+    parser.add_argument(
+        "--no-search-index",
+        action="store_true",
+        help="Don't update the full-text search index."
+    )
+    parser.add_argument(
+        "--consolidated",
+        type=str,
+        default=None,
+        help="Batch mode only: where to save the consolidated ledger."
+    )
+    parser.add_argument(
+        "--tolerant",
+        action="store_true",
+        help="Note lines that can't be parsed and carry on, reporting "
+             "them all at the end, instead of stopping at the first one."
+    )
+    parser.add_argument(
+        "--instrument",
+        type=str,
+        nargs="?",
+        const="",
+        default=None,
+        help="Time every handler and stage, and save the numbers as JSON "
+             "(to this file, or next to the report)."
+    )
+    parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="Save every page to a JSON Lines checkpoint next to the "
+             "report as it's parsed, until the run is done."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Pick up from the last complete page in the checkpoint "
+             "(implies --checkpoint)."
     )
 
     args = parser.parse_args()
     fname = args.filename
-    yr = int(re.search(r"\d{4}", fname).group(0))
 
-    g = GLProcessor(fname, yr)
-    try:
-        g.process()
-    except Exception:
-        print(g.pagelines[g.page][g.line], g.page + 1, g.line)
-        raise
+    cache_args = None
+    if not args.no_cache:
+        base = fname if os.path.isdir(fname) else os.path.dirname(fname)
+        cache_args = {
+            "directory": args.cache_dir or os.path.join(
+                os.path.abspath(base), ".gl_cache"
+            ),
+            "max_bytes": int(args.cache_size * 2**20),
+            "max_age": args.cache_age * 86400,
+        }
+
+    search = None
+    if not args.no_search_index:
+        base = fname if os.path.isdir(fname) else os.path.dirname(fname)
+        search = args.search_index or os.path.join(
+            os.path.abspath(base), ".gl_search"
+        )
+
+    if os.path.isdir(fname) or any(c in fname for c in "*?["):
+        from batch import run_batch
+
+        run_batch(
+            fname,
+            args.workers,
+            args.timeout,
+            args.format,
+            cache_args,
+            args.consolidated,
+            search,
+            not args.tolerant
+        )
+    else:
+        yr = int(re.search(r"\d{4}", fname).group(0))
+        cache = DiskCache(**cache_args) if cache_args else None
+        instruments = None
+        if args.instrument is not None:
+            instruments = Instruments(args.instrument or None)
+
+        checkpoint = None
+        if args.checkpoint or args.resume:
+            checkpoint = Checkpoint(
+                os.path.splitext(fname)[0] + "_checkpoint.jsonl", args.resume
+            )
+
+        g = GLProcessor(
+            fname,
+            yr,
+            cache,
+            search_index=search,
+            instruments=instruments,
+            strict=not args.tolerant,
+            checkpoint=checkpoint
+        )
+        try:
+            g.process(args.workers or 1, args.timeout, args.format)
+        except Exception:
+            print(g.pagelines[g.page][g.line], g.page + 1, g.line)
+            raise
 
-    g.save_to_excel()
+        g.save_to_excel()
@@ -0,0 +1,121 @@
+"""
+Opt-in timing and counting for GLProcessor, to find out where a slow run
+spends its time: how often each handler was called, how long it took and
+how many lines it ate, per account header, plus how long each stage of
+process (parsing, validating, disambiguating, saving, ...) took.
+
+Pass an Instruments to GLProcessor, and process writes it out as JSON
+when it's done (and save_to_excel again, with its own stage added).
+"""
+
+from typing import Any, Dict, Iterator, Optional
+
+import json
+import time
+import contextlib
+
+
+class Instruments:
+    def __init__(self, filename: Optional[str] = None):
+        """
+        `filename` is where save() writes the report by default.
+        """
+
+        self.filename = filename
+        self.stages: Dict[str, float] = {}
+        # header -> [handler, calls, seconds, lines]
+        self.headers: Dict[str, list] = {}
+        self.counters: Dict[str, int] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time everything in the with block as (part of) a stage.
+        """
+
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t
+            self.stages[name] = self.stages.get(name, 0) + elapsed
+
+    def handler(
+        self, header: str, handler: str, seconds: float, lines: int
+    ) -> None:
+        """
+        Record one call to a handler, for an entry under `header`.
+        """
+
+        stats = self.headers.get(header)
+        if stats is None:
+            stats = self.headers[header] = [handler, 0, 0.0, 0]
+
+        stats[1] += 1
+        stats[2] += seconds
+        stats[3] += lines
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, other: "Instruments") -> None:
+        """
+        Add in what another Instruments recorded (e.g. in a worker).
+        Stages aren't merged, since the workers' time is already
+        part of the stage that ran them.
+        """
+
+        for header, (handler, calls, seconds, lines) in other.headers.items():
+            stats = self.headers.get(header)
+            if stats is None:
+                stats = self.headers[header] = [handler, 0, 0.0, 0]
+
+            stats[1] += calls
+            stats[2] += seconds
+            stats[3] += lines
+
+        for name, n in other.counters.items():
+            self.count(name, n)
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Everything recorded, with the handler stats also added up by
+        handler, both sorted by the time they took.
+        """
+
+        handlers: Dict[str, Dict[str, Any]] = {}
+        headers = {}
+        for header, (handler, calls, seconds, lines) in sorted(
+            self.headers.items(), key=lambda kv: -kv[1][2]
+        ):
+            headers[header] = {
+                "handler": handler,
+                "calls": calls,
+                "seconds": seconds,
+                "lines": lines,
+            }
+
+            stats = handlers.setdefault(
+                handler, {"calls": 0, "seconds": 0.0, "lines": 0}
+            )
+            stats["calls"] += calls
+            stats["seconds"] += seconds
+            stats["lines"] += lines
+
+        handlers = dict(
+            sorted(handlers.items(), key=lambda kv: -kv[1]["seconds"])
+        )
+        return {
+            "stages": self.stages,
+            "handlers": handlers,
+            "headers": headers,
+            "counters": self.counters,
+        }
+
+    def save(self, filename: Optional[str] = None) -> None:
+        filename = filename or self.filename
+        if filename is None:
+            raise ValueError("Nowhere to save the instrumentation report.")
+
+        with open(filename, "w") as f:
+            json.dump(self.report(), f, indent=4)
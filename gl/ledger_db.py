@@ -0,0 +1,294 @@
+"""
+Processed GL ledgers in SQLite, as an alternative to the JSON dump.
+
+Amounts are stored as text, so nothing is lost going through floats,
+with the cents alongside for querying. Transactions are indexed by
+account and date, and by identifier, so looking something up doesn't
+mean loading the whole ledger.
+
+save_ledger writes everything GLProcessor.save would, plus what's needed
+to put a GLProcessor back together (see GLProcessor.from_sqlite) without
+parsing the report again.
+"""
+
+from utils import *
+from typing import Iterator
+
+import os
+import sqlite3
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE accounts (
+    name TEXT PRIMARY KEY,
+    number TEXT,
+    -- Order the header was first seen in, and order in the ledger
+    seen_order INTEGER,
+    ledger_order INTEGER
+);
+
+CREATE TABLE transactions (
+    account TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    identifier TEXT,
+    amount TEXT NOT NULL,
+    cents INTEGER NOT NULL,
+    tag TEXT,
+    ambiguous INTEGER NOT NULL,
+    description TEXT,
+    PRIMARY KEY (account, seq)
+);
+
+CREATE TABLE balance_forwards (
+    account TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    description TEXT,
+    PRIMARY KEY (account, seq)
+);
+
+CREATE TABLE monthly_totals (
+    account TEXT NOT NULL,
+    month TEXT NOT NULL,
+    debit TEXT NOT NULL,
+    credit TEXT NOT NULL,
+    PRIMARY KEY (account, month)
+);
+
+CREATE TABLE balances (
+    account TEXT PRIMARY KEY,
+    debit TEXT NOT NULL,
+    credit TEXT NOT NULL
+);
+
+CREATE TABLE validity (
+    account TEXT NOT NULL,
+    month TEXT NOT NULL,
+    valid INTEGER NOT NULL,
+    PRIMARY KEY (account, month)
+);
+"""
+
+# Built after the bulk insert, which is faster than keeping them up to date
+INDICES = """
+CREATE INDEX transactions_by_date
+    ON transactions (account, ordinal, identifier);
+CREATE INDEX transactions_by_identifier ON transactions (identifier);
+"""
+
+
+def transaction_rows(transactions: Dict[str, List[Transaction]]) -> Iterator:
+    for header, ts in transactions.items():
+        for i, t in enumerate(ts):
+            yield (
+                header, i, t.date, t.ordinal, t.month, t.identifier,
+                str(t.amt), t.cents, t.tag, int(bool(t.ambiguous)), t.desc,
+            )
+
+
+def save_ledger(g, filename: str) -> None:
+    """
+    Write the state of GLProcessor g to a new SQLite database.
+    An existing database at `filename` is only replaced once
+    the new one has been written in full.
+    """
+
+    tmp = filename + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    con = sqlite3.connect(tmp)
+    try:
+        con.executescript(SCHEMA)
+        with con:
+            meta = {
+                "version": SCHEMA_VERSION,
+                "filename": g.filename,
+                "year": g.yr,
+                "totals": ",".join(str(x) for x in g.totals),
+            }
+            con.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                [(k, None if v is None else str(v)) for k, v in meta.items()]
+            )
+
+            names = list(g.header_numbers) + [
+                h for h in g.transactions if h not in g.header_numbers
+            ]
+            seen = {h: i for i, h in enumerate(g.header_numbers)}
+            ledger = {h: i for i, h in enumerate(g.transactions)}
+            con.executemany(
+                "INSERT INTO accounts VALUES (?, ?, ?, ?)",
+                [
+                    (h, g.header_numbers.get(h), seen.get(h), ledger.get(h))
+                    for h in names
+                ]
+            )
+
+            con.executemany(
+                "INSERT INTO transactions VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                transaction_rows(g.transactions)
+            )
+
+            con.executemany(
+                "INSERT INTO balance_forwards VALUES (?, ?, ?, ?, ?)",
+                [
+                    (h, i, t.date, str(t.amt), t.desc)
+                    for h, ts in g.balance_forwards.items()
+                    for i, t in enumerate(ts)
+                ]
+            )
+
+            con.executemany(
+                "INSERT INTO monthly_totals VALUES (?, ?, ?, ?)",
+                [
+                    (h, m, str(deb), str(cred))
+                    for h, months in g.all_monthly_totals().items()
+                    for m, (deb, cred) in months.items()
+                ]
+            )
+
+            con.executemany(
+                "INSERT INTO balances VALUES (?, ?, ?)",
+                [
+                    (h, str(deb), str(cred))
+                    for h, (deb, cred) in g.balances.items()
+                ]
+            )
+
+            rows = []
+            for h, v in g.valid.items():
+                if h == ALL:
+                    rows.append((ALL, ALL, int(v)))
+                else:
+                    rows += [(h, m, int(ok)) for m, ok in v.items()]
+
+            con.executemany("INSERT INTO validity VALUES (?, ?, ?)", rows)
+
+        con.executescript(INDICES)
+    finally:
+        con.close()
+
+    os.replace(tmp, filename)
+
+
+def connect(filename: str) -> sqlite3.Connection:
+    """
+    Open a saved ledger (read only), checking that it's one we understand.
+    """
+
+    if not os.path.exists(filename):
+        raise FileNotFoundError(filename)
+
+    con = sqlite3.connect(f"file:{filename}?mode=ro", uri=True)
+    try:
+        (version,) = con.execute(
+            "SELECT value FROM meta WHERE key = 'version'"
+        ).fetchone()
+    except (sqlite3.DatabaseError, TypeError):
+        con.close()
+        raise ValueError(f"{filename} is not a saved GL ledger.")
+
+    if int(version) != SCHEMA_VERSION:
+        con.close()
+        raise ValueError(
+            f"{filename} was saved with ledger version {version}, "
+            f"but this is version {SCHEMA_VERSION}."
+        )
+
+    return con
+
+
+def load_ledger(filename: str) -> Dict[str, Any]:
+    """
+    Everything save_ledger wrote, as the same kind of objects
+    GLProcessor keeps them in.
+    """
+
+    con = connect(filename)
+    try:
+        meta = dict(con.execute("SELECT key, value FROM meta"))
+        yr = meta.get("year")
+        totals = meta.get("totals") or ""
+
+        accounts = con.execute(
+            "SELECT name, number, seen_order, ledger_order FROM accounts"
+        ).fetchall()
+        header_numbers = {
+            name: num for name, num, seen, _ in
+            sorted((a for a in accounts if a[2] is not None),
+                   key=lambda a: a[2])
+        }
+        ledger = [
+            name for name, _, _, order in
+            sorted((a for a in accounts if a[3] is not None),
+                   key=lambda a: a[3])
+        ]
+
+        transactions: Dict[str, List[Transaction]] = {h: [] for h in ledger}
+        rows = con.execute(
+            "SELECT account, date, identifier, amount, tag, ambiguous, "
+            "description FROM transactions ORDER BY account, seq"
+        )
+        for h, date, iden, amt, tag, amb, desc in rows:
+            transactions[h].append(
+                Transaction(date, iden, Decimal(amt), tag, bool(amb), desc)
+            )
+
+        balance_forwards: Dict[str, List[Transaction]] = {}
+        rows = con.execute(
+            "SELECT account, date, amount, description "
+            "FROM balance_forwards ORDER BY rowid"
+        )
+        for h, date, amt, desc in rows:
+            balance_forwards.setdefault(h, []).append(
+                Transaction(date, "", Decimal(amt), "", desc=desc)
+            )
+
+        monthly_totals: Dict[str, Dict[str, List[Decimal]]] = {}
+        rows = con.execute(
+            "SELECT account, month, debit, credit "
+            "FROM monthly_totals ORDER BY rowid"
+        )
+        for h, m, deb, cred in rows:
+            monthly_totals.setdefault(h, {})[m] = [Decimal(deb), Decimal(cred)]
+
+        balances = {
+            h: [Decimal(deb), Decimal(cred)] for h, deb, cred in
+            con.execute("SELECT * FROM balances ORDER BY rowid")
+        }
+
+        valid: Dict[str, Any] = {h: {} for h in ledger}
+        rows = con.execute(
+            "SELECT account, month, valid FROM validity ORDER BY rowid"
+        )
+        for h, m, ok in rows:
+            if h == ALL and m == ALL:
+                valid[ALL] = bool(ok)
+            else:
+                valid.setdefault(h, {})[m] = bool(ok)
+    finally:
+        con.close()
+
+    return {
+        "filename": meta.get("filename"),
+        "yr": None if yr is None else int(yr),
+        "totals": tuple(Decimal(x) for x in totals.split(",") if x),
+        "header_numbers": header_numbers,
+        "transactions": transactions,
+        "balance_forwards": balance_forwards,
+        "monthly_totals": monthly_totals,
+        "balances": balances,
+        "valid": valid,
+    }
@@ -0,0 +1,260 @@
+"""
+What changed between two processed GL ledgers, e.g. after the bookkeeper
+re-exports a report with corrections: transactions that were added,
+removed, or had their amount or description changed, and monthly totals
+that are different.
+
+Transactions are matched within their account on (date, identifier),
+the same key Transaction's __eq__ and __hash__ use. If the same key shows
+up more than once in an account, the first is matched with the first,
+the second with the second, and so on. The old ledger is loaded into a
+hash table and the new one is streamed past it, so each ledger is only
+gone through once.
+
+Either ledger can be the JSON or the SQLite (see ledger_db) output:
+
+    python ledger_diff.py GL2022_processed.json GL2022_fixed_processed.db
+"""
+
+from utils import *
+from typing import Iterator
+
+import json
+import argparse
+
+# account, date, identifier, amount, description
+Row = Tuple[str, str, str, str, str]
+Totals = Dict[str, Dict[str, Tuple[Decimal, Decimal]]]
+
+
+class TransactionChange(NamedTuple):
+    # "added", "removed" or "changed"
+    kind: str
+    account: str
+    date: str
+    identifier: str
+    old_amt: Optional[Decimal] = None
+    new_amt: Optional[Decimal] = None
+    old_desc: Optional[str] = None
+    new_desc: Optional[str] = None
+
+    def __str__(self) -> str:
+        where = f"{self.account}  {self.date}  {self.identifier}"
+        if self.kind == "added":
+            return f"+ {where}  {self.new_amt}  {self.new_desc}"
+        elif self.kind == "removed":
+            return f"- {where}  {self.old_amt}  {self.old_desc}"
+
+        out = f"~ {where}"
+        if self.old_amt != self.new_amt:
+            out += f"  {self.old_amt} -> {self.new_amt}"
+
+        if self.old_desc != self.new_desc:
+            out += f"  {self.old_desc!r} -> {self.new_desc!r}"
+
+        return out
+
+
+class TotalChange(NamedTuple):
+    account: str
+    month: str
+    # (debit, credit), or None if the month isn't in that ledger
+    old: Optional[Tuple[Decimal, Decimal]]
+    new: Optional[Tuple[Decimal, Decimal]]
+
+    def __str__(self) -> str:
+        def fmt(v: Optional[Tuple[Decimal, Decimal]]) -> str:
+            return "none" if v is None else f"{v[0]} / {v[1]}"
+
+        return (
+            f"{self.account}, {self.month}: {fmt(self.old)} -> "
+            f"{fmt(self.new)}"
+        )
+
+
+class LedgerDiff(NamedTuple):
+    transactions: List[TransactionChange]
+    totals: List[TotalChange]
+
+    def count(self, kind: str) -> int:
+        return sum(1 for c in self.transactions if c.kind == kind)
+
+
+def read_json(filename: str) -> Tuple[Iterator[Row], Totals]:
+    with open(filename, "rb") as f:
+        d = json.load(f)
+
+    # Totals were saved as floats, so they go through str to get the cents
+    totals = {
+        h: {
+            m: (Decimal(str(deb)), Decimal(str(cred)))
+            for m, (deb, cred) in months.items()
+        }
+        for h, months in d.get("Monthly Totals", {}).items()
+    }
+
+    def rows() -> Iterator[Row]:
+        for h, ts in d["Transactions"].items():
+            for t in ts:
+                yield h, t["date"], t["identifier"], t["amt"], t["desc"]
+
+    return rows(), totals
+
+
+def read_sqlite(filename: str) -> Tuple[Iterator[Row], Totals]:
+    from ledger_db import connect
+
+    con = connect(filename)
+    totals: Totals = {}
+    for h, m, deb, cred in con.execute(
+        "SELECT account, month, debit, credit "
+        "FROM monthly_totals ORDER BY rowid"
+    ):
+        totals.setdefault(h, {})[m] = (Decimal(deb), Decimal(cred))
+
+    def rows() -> Iterator[Row]:
+        try:
+            yield from con.execute(
+                "SELECT account, date, identifier, amount, description "
+                "FROM transactions ORDER BY account, seq"
+            )
+        finally:
+            con.close()
+
+    return rows(), totals
+
+
+def read_ledger(filename: str) -> Tuple[Iterator[Row], Totals]:
+    """
+    The transactions of a processed ledger, as rows in the order they're
+    stored, and its monthly totals.
+    """
+
+    if filename.endswith(".db"):
+        return read_sqlite(filename)
+    elif filename.endswith(".json"):
+        return read_json(filename)
+
+    raise ValueError(f"{filename} isn't a processed ledger (.json or .db).")
+
+
+def same_amount(a: str, b: str) -> bool:
+    # Usually they're written the same way; 1.5 and 1.50 are the same too
+    return a == b or Decimal(a) == Decimal(b)
+
+
+def diff_totals(old: Totals, new: Totals) -> List[TotalChange]:
+    changes = []
+    for h in list(old) + [h for h in new if h not in old]:
+        before, after = old.get(h, {}), new.get(h, {})
+        for m in MONTHS:
+            a, b = before.get(m), after.get(m)
+            # A month that's missing is a month with nothing in it
+            if (a or (0, 0)) == (b or (0, 0)):
+                continue
+
+            changes.append(TotalChange(h, m, a, b))
+
+    return changes
+
+
+def diff_ledgers(old: str, new: str) -> LedgerDiff:
+    """
+    Everything that changed going from the ledger in `old` to the one in
+    `new`. Added and changed transactions come in the new ledger's order,
+    followed by the removed ones.
+    """
+
+    old_rows, old_totals = read_ledger(old)
+
+    # (account, date, identifier) -> amount, description, with any
+    # more with the same key kept aside, in order
+    index: Dict[Tuple[str, str, str], Tuple[str, str]] = {}
+    repeats: Dict[Tuple[str, str, str], List[Tuple[str, str]]] = {}
+    for h, date, iden, amt, desc in old_rows:
+        k = (h, date, iden)
+        if k in index:
+            repeats.setdefault(k, []).append((amt, desc))
+        else:
+            index[k] = (amt, desc)
+
+    new_rows, new_totals = read_ledger(new)
+    changes = []
+    for h, date, iden, amt, desc in new_rows:
+        k = (h, date, iden)
+        before = index.pop(k, None)
+        if before is None and k in repeats:
+            before = repeats[k].pop(0)
+            if not repeats[k]:
+                del repeats[k]
+
+        if before is None:
+            changes.append(TransactionChange(
+                "added", h, date, iden, new_amt=Decimal(amt), new_desc=desc
+            ))
+        elif not same_amount(before[0], amt) or before[1] != desc:
+            changes.append(TransactionChange(
+                "changed", h, date, iden,
+                Decimal(before[0]), Decimal(amt), before[1], desc
+            ))
+
+    # Whatever wasn't matched is gone
+    left = list(index.items()) + [
+        (k, r) for k, rs in repeats.items() for r in rs
+    ]
+    for (h, date, iden), (amt, desc) in left:
+        changes.append(TransactionChange(
+            "removed", h, date, iden, old_amt=Decimal(amt), old_desc=desc
+        ))
+
+    return LedgerDiff(changes, diff_totals(old_totals, new_totals))
+
+
+def save_diff(diff: LedgerDiff, filename: str) -> None:
+    def plain(c: NamedTuple) -> Dict[str, Any]:
+        return {k: v for k, v in c._asdict().items() if v is not None}
+
+    with open(filename, "w") as f:
+        json.dump(
+            {
+                "transactions": [plain(c) for c in diff.transactions],
+                "totals": [plain(c) for c in diff.totals],
+            },
+            f,
+            indent=4,
+            default=str
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Show what changed between two processed GL ledgers."
+    )
+    parser.add_argument("old", type=str, help="The earlier ledger.")
+    parser.add_argument("new", type=str, help="The corrected ledger.")
+    parser.add_argument(
+        "--json", type=str, default=None, help="Save the changes here."
+    )
+    parser.add_argument(
+        "--summary",
+        action="store_true",
+        help="Only print how many things changed."
+    )
+
+    args = parser.parse_args()
+    diff = diff_ledgers(args.old, args.new)
+    if not args.summary:
+        for change in diff.transactions:
+            print(change)
+
+        for change in diff.totals:
+            print(f"Monthly totals, {change}")
+
+    print(
+        f"{diff.count('added')} added, {diff.count('removed')} removed, "
+        f"{diff.count('changed')} changed, "
+        f"{len(diff.totals)} monthly total(s) changed"
+    )
+
+    if args.json:
+        save_diff(diff, args.json)
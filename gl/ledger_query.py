@@ -0,0 +1,337 @@
+"""
+Indexed lookups over a processed GL ledger, for the questions month-end
+review keeps asking ("all Telephone-Hby transactions between March and
+June over $500", "every entry with identifier AP06421", ...).
+
+Each account's transactions are indexed by date (sorted ordinals, so a
+date range is two binary searches) with their amounts alongside for
+filtering, and every identifier is hashed to where it shows up. The
+index, along with the transactions themselves, can be saved to a file
+and loaded from a fresh process without touching the report or ledger.
+"""
+
+from utils import *
+from typing import Iterator, Union
+from datetime import date
+
+import os
+import json
+import pickle
+import argparse
+
+INDEX_VERSION = 1
+
+DateLike = Union[str, date]
+
+
+def to_ordinal(d: DateLike) -> int:
+    """
+    The ordinal of a date, given as a date or as MM/DD/YY.
+    """
+
+    if isinstance(d, str):
+        return parse_date(d)[0]
+
+    return d.toordinal()
+
+
+class AccountIndex:
+    def __init__(
+        self, number: Optional[str], transactions: List[Transaction]
+    ):
+        """
+        Sorts the account's transactions by date (keeping the report's
+        order within a day), with their dates and amounts as arrays.
+        """
+
+        self.number = number
+        ordinals = np.array(
+            [t.ordinal for t in transactions], dtype=np.int64
+        )
+        order = np.argsort(ordinals, kind="stable")
+        self.transactions = [transactions[i] for i in order]
+        self.ordinals = ordinals[order]
+        self.cents = np.array(
+            [t.cents for t in self.transactions], dtype=np.int64
+        )
+
+    def __len__(self) -> int:
+        return len(self.transactions)
+
+    def query(
+        self,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        min_cents: Optional[int] = None,
+        max_cents: Optional[int] = None,
+        side: Optional[str] = None
+    ) -> Iterator[Transaction]:
+        """
+        Transactions dated from `start` to `end` (ordinals, inclusive)
+        whose size (ignoring sign) is between min_cents and max_cents,
+        only debits or credits if `side` says so.
+        """
+
+        lo = 0 if start is None else np.searchsorted(self.ordinals, start)
+        hi = len(self) if end is None else np.searchsorted(
+            self.ordinals, end, side="right"
+        )
+
+        cents = self.cents[lo:hi]
+        mask = np.ones(len(cents), dtype=bool)
+        if min_cents is not None:
+            mask &= np.abs(cents) >= min_cents
+
+        if max_cents is not None:
+            mask &= np.abs(cents) <= max_cents
+
+        if side == "debit":
+            mask &= cents > 0
+        elif side == "credit":
+            mask &= cents < 0
+        elif side is not None:
+            raise ValueError(f"side should be debit or credit, not {side}.")
+
+        for i in np.flatnonzero(mask):
+            yield self.transactions[lo + i]
+
+
+class LedgerIndex:
+    def __init__(
+        self,
+        transactions: Dict[str, List[Transaction]],
+        header_numbers: Dict[str, str]
+    ):
+        self.accounts = {
+            h: AccountIndex(header_numbers.get(h), ts)
+            for h, ts in transactions.items()
+        }
+
+        # identifier -> [(header, position in that account's index)]
+        self.identifiers: Dict[str, List[Tuple[str, int]]] = {}
+        for h, account in self.accounts.items():
+            for i, t in enumerate(account.transactions):
+                self.identifiers.setdefault(t.identifier, []).append((h, i))
+
+    @classmethod
+    def from_processor(cls, g) -> "LedgerIndex":
+        """
+        Index the transactions of a processed GLProcessor.
+        """
+
+        return cls(
+            {h: ts for h, ts in g.transactions.items() if ts},
+            g.header_numbers
+        )
+
+    @classmethod
+    def from_json(cls, filename: str) -> "LedgerIndex":
+        """
+        Index the transactions of a ledger saved as JSON. The account
+        numbers aren't in there, so accounts can only go by header.
+        """
+
+        with open(filename, "rb") as f:
+            d = json.load(f)
+
+        return cls(
+            {
+                h: [Transaction.from_json(t) for t in ts]
+                for h, ts in d["Transactions"].items() if ts
+            },
+            {}
+        )
+
+    def save(self, filename: str) -> None:
+        """
+        Pickle the index along with the transactions, which are
+        Transactions, so loading it needs the same utils that saved it
+        (INDEX_VERSION goes up when they change).
+        """
+
+        state = {
+            "version": INDEX_VERSION,
+            "accounts": {
+                h: (a.number, a.transactions, a.ordinals, a.cents)
+                for h, a in self.accounts.items()
+            },
+            "identifiers": self.identifiers,
+        }
+
+        tmp = filename + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmp, filename)
+
+    @classmethod
+    def load(cls, filename: str) -> "LedgerIndex":
+        with open(filename, "rb") as f:
+            state = pickle.load(f)
+
+        version = state.get("version")
+        if version != INDEX_VERSION:
+            raise ValueError(
+                f"{filename} is a version {version} index, "
+                f"but this is version {INDEX_VERSION}. Rebuild it."
+            )
+
+        index = cls.__new__(cls)
+        index.accounts = {}
+        for h, (number, transactions, ordinals, cents) in (
+            state["accounts"].items()
+        ):
+            a = AccountIndex.__new__(AccountIndex)
+            a.number, a.transactions = number, transactions
+            a.ordinals, a.cents = ordinals, cents
+            index.accounts[h] = a
+
+        index.identifiers = state["identifiers"]
+        return index
+
+    def account(self, account: str) -> str:
+        """
+        The header of an account, given its header or its number.
+        """
+
+        if account in self.accounts:
+            return account
+
+        for h, a in self.accounts.items():
+            if a.number == account:
+                return h
+
+        raise ValueError(f"No account {account} in the ledger.")
+
+    def query(
+        self,
+        account: Optional[str] = None,
+        start: Optional[DateLike] = None,
+        end: Optional[DateLike] = None,
+        min_amount: Optional[Decimal] = None,
+        max_amount: Optional[Decimal] = None,
+        identifier: Optional[str] = None,
+        side: Optional[str] = None
+    ) -> List[Tuple[str, Transaction]]:
+        """
+        (header, transaction) for every transaction that matches all of
+        the given filters, by account and then by date.
+
+        Dates are inclusive, as dates or MM/DD/YY. Amounts are compared
+        without their sign; use side="debit" or "credit" for that.
+        """
+
+        if side not in (None, "debit", "credit"):
+            raise ValueError(f"side should be debit or credit, not {side}.")
+
+        start = None if start is None else to_ordinal(start)
+        end = None if end is None else to_ordinal(end)
+        min_cents = None if min_amount is None else to_cents(
+            Decimal(min_amount)
+        )
+        max_cents = None if max_amount is None else to_cents(
+            Decimal(max_amount)
+        )
+        headers = list(self.accounts)
+        if account is not None:
+            headers = [self.account(account)]
+
+        if identifier is not None:
+            hits = [
+                (h, i) for h, i in self.identifiers.get(identifier, [])
+                if h in headers
+            ]
+            results = []
+            for h, i in hits:
+                t = self.accounts[h].transactions[i]
+                if (
+                    (start is None or t.ordinal >= start)
+                    and (end is None or t.ordinal <= end)
+                    and (min_cents is None or abs(t.cents) >= min_cents)
+                    and (max_cents is None or abs(t.cents) <= max_cents)
+                    and (side != "debit" or t.cents > 0)
+                    and (side != "credit" or t.cents < 0)
+                ):
+                    results.append((h, t))
+
+            return results
+
+        return [
+            (h, t) for h in headers
+            for t in self.accounts[h].query(
+                start, end, min_cents, max_cents, side
+            )
+        ]
+
+
+def open_index(filename: str) -> LedgerIndex:
+    """
+    Load an index file, or build one from a SQLite (see ledger_db) or
+    JSON ledger, saving it next to the ledger so the next lookup can
+    just load it.
+    """
+
+    base, ext = os.path.splitext(filename)
+    if ext not in (".db", ".json"):
+        return LedgerIndex.load(filename)
+
+    # The JSON doesn't have the account numbers, so it gets its own
+    index_file = base + ("_index.pkl" if ext == ".db" else "_json_index.pkl")
+    if (
+        os.path.exists(index_file)
+        and os.path.getmtime(index_file) >= os.path.getmtime(filename)
+    ):
+        return LedgerIndex.load(index_file)
+
+    if ext == ".json":
+        index = LedgerIndex.from_json(filename)
+    else:
+        from gl_processor import GLProcessor
+
+        index = LedgerIndex.from_processor(GLProcessor.from_sqlite(filename))
+
+    index.save(index_file)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Look up transactions in a processed GL ledger."
+    )
+    parser.add_argument(
+        "ledger",
+        type=str,
+        help="A processed ledger (GL2022_processed.json or .db) "
+             "or an index file."
+    )
+    parser.add_argument(
+        "--account",
+        type=str,
+        help="Header or number (only the header for a JSON ledger)."
+    )
+    parser.add_argument("--start", type=str, help="From this MM/DD/YY.")
+    parser.add_argument("--end", type=str, help="Up to this MM/DD/YY.")
+    parser.add_argument("--min", type=Decimal, help="At least this much.")
+    parser.add_argument("--max", type=Decimal, help="At most this much.")
+    parser.add_argument("--identifier", type=str)
+    parser.add_argument("--side", choices=["debit", "credit"])
+
+    args = parser.parse_args()
+    index = open_index(args.ledger)
+    results = index.query(
+        args.account,
+        args.start,
+        args.end,
+        args.min,
+        args.max,
+        args.identifier,
+        args.side
+    )
+
+    for header, t in results:
+        print(
+            f"{index.accounts[header].number or header}  {t.date}  "
+            f"{t.identifier:<14}{t.amt:>14}  {t.tag or '':<10}{t.desc}"
+        )
+
+    print(f"{len(results)} transaction(s)")
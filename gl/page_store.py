@@ -0,0 +1,150 @@
+"""
+Lazy access to the pages of a GL report.
+
+The report is memory-mapped instead of read into a string, the page
+boundaries (seven newlines) are indexed once up front, and a page is only
+split into lines when something asks for it. Only the last few pages
+asked for are kept around, and a page can be released as soon as it has
+been processed, so memory use doesn't grow with the size of the report.
+"""
+
+from utils import *
+from typing import List, Sequence
+from collections import OrderedDict
+
+import mmap
+import locale
+
+
+class Page(NamedTuple):
+    raw: List[str]
+    stripped: List[str]
+    kinds: List[int]
+
+
+class PageView(Sequence):
+    """
+    Looks like a list of pages (each a list of lines), but only
+    materializes the pages that are actually indexed.
+    """
+
+    def __init__(self, store: "PageStore", field: str):
+        self.store = store
+        self.field = Page._fields.index(field)
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getitem__(self, p: int) -> List:
+        store = self.store
+        if p == store.last:
+            return store.last_page[self.field]
+
+        return store.page(p)[self.field]
+
+
+class PageStore:
+    def __init__(
+        self,
+        filename: Optional[str],
+        encoding: Optional[str] = None,
+        keep: int = 2
+    ):
+        """
+        Index the pages of the report in `filename`. Decodes the same way
+        open(filename, "r") would, unless told otherwise, and keeps the
+        last `keep` pages that were used in memory.
+        With no filename, the store is empty.
+        """
+
+        self.filename = filename
+        self.encoding = encoding or locale.getpreferredencoding(False)
+        self.keep = keep
+        self.file = None if filename is None else open(filename, "rb")
+        try:
+            self.buffer = mmap.mmap(
+                self.file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        except (AttributeError, ValueError):
+            # No file, or an empty one (which can't be mapped)
+            self.buffer = b""
+
+        # Reading in text mode turns \r\n into \n, so seven \r\n's
+        # is what separates pages in a Windows-style report
+        newline = b"\r\n" if b"\r\n" in self.buffer[:1 << 16] else b"\n"
+        sep = newline * 7
+
+        self.offsets: List[Tuple[int, int]] = []
+        start = 0
+        while True:
+            end = self.buffer.find(sep, start)
+            if end < 0:
+                self.offsets.append((start, len(self.buffer)))
+                break
+
+            self.offsets.append((start, end))
+            start = end + len(sep)
+
+        self.cache: OrderedDict[int, Page] = OrderedDict()
+        self.last: Optional[int] = None
+        self.last_page: Optional[Page] = None
+        self.raw = PageView(self, "raw")
+        self.stripped = PageView(self, "stripped")
+        self.kinds = PageView(self, "kinds")
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def data(self, p: int) -> bytes:
+        """
+        The undecoded bytes of page p.
+        """
+
+        start, end = self.offsets[p]
+        return self.buffer[start:end]
+
+    def text(self, p: int) -> str:
+        """
+        The text of page p, stripped, with newlines normalized.
+        """
+
+        text = self.data(p).decode(self.encoding)
+        return text.replace("\r\n", "\n").replace("\r", "\n").strip()
+
+    def page(self, p: int) -> Page:
+        """
+        Page p, split into lines (and classified), from the cache if possible.
+        """
+
+        if p in self.cache:
+            self.cache.move_to_end(p)
+            page = self.cache[p]
+        else:
+            raw = self.text(p).splitlines()
+            stripped = [l.strip() for l in raw]
+            page = Page(raw, stripped, classify_lines(stripped))
+
+            self.cache[p] = page
+            while len(self.cache) > self.keep:
+                self.cache.popitem(last=False)
+
+        self.last, self.last_page = p, page
+        return page
+
+    def release(self, p: int) -> None:
+        """
+        Forget the lines of page p; they'll be rebuilt if asked for again.
+        """
+
+        self.cache.pop(p, None)
+        if p == self.last:
+            self.last, self.last_page = None, None
+
+    def close(self) -> None:
+        self.cache.clear()
+        self.last, self.last_page = None, None
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+        if self.file is not None:
+            self.file.close()
@@ -0,0 +1,297 @@
+"""
+Full-text search over the descriptions and identifiers of processed
+GL transactions, across accounts and years.
+
+The index is a directory. Each (report, account) pair is a segment with
+its own file holding its transactions and the postings of every word in
+them, and a manifest maps every word to the segments it shows up in.
+A search only opens the segments that can match. When a report is saved
+again, only the accounts whose transactions changed are re-indexed.
+
+Words are runs of letters and digits, lowercased, so "Void ck#11256"
+is void, ck and 11256. Whole identifiers are words too.
+"""
+
+from utils import *
+from typing import Iterator, Set
+
+import os
+import pickle
+import hashlib
+import argparse
+
+INDEX_VERSION = 1
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def words(text: Optional[str]) -> List[str]:
+    return WORD.findall(text.lower()) if text else []
+
+
+def transaction_words(t: Transaction) -> Set[str]:
+    ws = set(words(t.desc)) | set(words(t.identifier))
+    if t.identifier:
+        ws.add(t.identifier.lower())
+
+    return ws
+
+
+def fingerprint(transactions: List[Transaction]) -> str:
+    """
+    Changes whenever anything that's indexed or shown in a hit does.
+    """
+
+    h = hashlib.sha1()
+    for t in transactions:
+        h.update(
+            f"{t.date}|{t.identifier}|{t.amt}|{t.tag}|{t.desc}\n".encode()
+        )
+
+    return h.hexdigest()
+
+
+class Hit(NamedTuple):
+    report: str
+    year: Optional[int]
+    account: str
+    number: Optional[str]
+    transaction: Transaction
+
+
+class SearchIndex:
+    def __init__(self, directory: str):
+        """
+        Open the index in `directory`, making a new one if there isn't one.
+        """
+
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "segments"), exist_ok=True)
+
+        # segment id -> report, year, account, number, fingerprint
+        self.segments: Dict[str, Dict[str, Any]] = {}
+        # word -> ids of the segments it shows up in
+        self.vocab: Dict[str, Set[str]] = {}
+        self.loaded: Dict[str, Dict[str, Any]] = {}
+        self.sorted_vocab: Optional[List[str]] = None
+
+        manifest = os.path.join(directory, "manifest.pkl")
+        if os.path.exists(manifest):
+            with open(manifest, "rb") as f:
+                state = pickle.load(f)
+
+            if state.get("version") == INDEX_VERSION:
+                self.segments = state["segments"]
+                self.vocab = state["vocab"]
+
+    def segment_path(self, seg: str) -> str:
+        return os.path.join(self.directory, "segments", seg + ".pkl")
+
+    def segment(self, seg: str) -> Dict[str, Any]:
+        """
+        The transactions and postings of a segment.
+        """
+
+        if seg not in self.loaded:
+            with open(self.segment_path(seg), "rb") as f:
+                self.loaded[seg] = pickle.load(f)
+
+        return self.loaded[seg]
+
+    def dump(self, path: str, value: Any) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmp, path)
+
+    def remove_segment(self, seg: str) -> None:
+        try:
+            old_words = self.segment(seg)["postings"]
+        except (OSError, pickle.UnpicklingError, EOFError):
+            # Lost the file, fall back to looking through everything
+            old_words = list(self.vocab)
+
+        for w in old_words:
+            ids = self.vocab.get(w)
+            if ids is not None:
+                ids.discard(seg)
+                if not ids:
+                    del self.vocab[w]
+
+        del self.segments[seg]
+        self.loaded.pop(seg, None)
+        try:
+            os.remove(self.segment_path(seg))
+        except OSError:
+            pass
+
+    def update(self, g, report: Optional[str] = None) -> int:
+        """
+        Bring the index up to date with GLProcessor g's transactions.
+        Accounts that haven't changed since they were last indexed are
+        left alone. Returns how many accounts were (re-)indexed.
+        """
+
+        report = report or os.path.basename(g.filename)
+        current = {h: ts for h, ts in g.transactions.items() if ts}
+        ids = {
+            h: hashlib.sha1(f"{report}|{h}".encode()).hexdigest()[:20]
+            for h in current
+        }
+
+        # Accounts that aren't in the report any more
+        for seg, meta in list(self.segments.items()):
+            if meta["report"] == report and meta["account"] not in current:
+                self.remove_segment(seg)
+
+        updated = 0
+        for h, transactions in current.items():
+            seg = ids[h]
+            fp = fingerprint(transactions)
+            if seg in self.segments:
+                if self.segments[seg]["fingerprint"] == fp:
+                    continue
+
+                self.remove_segment(seg)
+
+            postings: Dict[str, List[int]] = {}
+            for i, t in enumerate(transactions):
+                for w in transaction_words(t):
+                    postings.setdefault(w, []).append(i)
+
+            data = {"transactions": list(transactions), "postings": postings}
+            self.dump(self.segment_path(seg), data)
+            self.loaded[seg] = data
+            self.segments[seg] = {
+                "report": report,
+                "year": g.yr,
+                "account": h,
+                "number": g.header_numbers.get(h),
+                "fingerprint": fp,
+            }
+            for w in postings:
+                self.vocab.setdefault(w, set()).add(seg)
+
+            updated += 1
+
+        if updated:
+            self.sorted_vocab = None
+
+        self.save()
+        return updated
+
+    def save(self) -> None:
+        self.dump(
+            os.path.join(self.directory, "manifest.pkl"),
+            {
+                "version": INDEX_VERSION,
+                "segments": self.segments,
+                "vocab": self.vocab,
+            }
+        )
+
+    def expand(self, term: str) -> List[str]:
+        """
+        The indexed words a query term stands for: itself, or every
+        word starting with it if it ends in *.
+        """
+
+        if not term.endswith("*"):
+            return [term] if term in self.vocab else []
+
+        prefix = term[:-1]
+        if self.sorted_vocab is None:
+            self.sorted_vocab = sorted(self.vocab)
+
+        i = bisect.bisect_left(self.sorted_vocab, prefix)
+        out = []
+        while (
+            i < len(self.sorted_vocab)
+            and self.sorted_vocab[i].startswith(prefix)
+        ):
+            out.append(self.sorted_vocab[i])
+            i += 1
+
+        return out
+
+    def search(
+        self, query: str, account: Optional[str] = None
+    ) -> Iterator[Hit]:
+        """
+        Every transaction that has all the words in the query
+        (a word ending in * matches anything starting with it),
+        optionally only in one account (by header or number).
+        """
+
+        terms = []
+        for part in query.split():
+            ws = words(part)
+            if ws and part.endswith("*"):
+                ws[-1] += "*"
+
+            terms += ws
+
+        if not terms:
+            return
+
+        expanded = [self.expand(t) for t in terms]
+        candidates: Optional[Set[str]] = None
+        for ws in expanded:
+            segs = set().union(*(self.vocab[w] for w in ws))
+            candidates = segs if candidates is None else candidates & segs
+
+        for seg in sorted(
+            candidates,
+            key=lambda s: (
+                self.segments[s]["year"] or 0, self.segments[s]["account"]
+            )
+        ):
+            meta = self.segments[seg]
+            if account is not None and account not in (
+                meta["account"], meta["number"]
+            ):
+                continue
+
+            data = self.segment(seg)
+            positions: Optional[Set[int]] = None
+            for ws in expanded:
+                ps = set().union(
+                    *(data["postings"].get(w, ()) for w in ws)
+                )
+                positions = ps if positions is None else positions & ps
+
+            for i in sorted(positions):
+                yield Hit(
+                    meta["report"],
+                    meta["year"],
+                    meta["account"],
+                    meta["number"],
+                    data["transactions"][i],
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Search the descriptions and identifiers of processed "
+                    "GL transactions."
+    )
+    parser.add_argument("index", type=str, help="The index directory.")
+    parser.add_argument(
+        "query", type=str, help="Words to look for; end one with * "
+                                "to match anything starting with it."
+    )
+    parser.add_argument("--account", type=str, help="Header or number.")
+
+    args = parser.parse_args()
+    if not os.path.exists(os.path.join(args.index, "manifest.pkl")):
+        raise ValueError(f"There's no search index in {args.index}.")
+
+    hits = list(SearchIndex(args.index).search(args.query, args.account))
+    for hit in hits:
+        t = hit.transaction
+        print(
+            f"{hit.year}  {hit.number}  {t.date}  {t.identifier:<14}"
+            f"{t.amt:>14}  {t.desc}"
+        )
+
+    print(f"{len(hits)} hit(s)")
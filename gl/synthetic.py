@@ -0,0 +1,403 @@
+"""
+Synthetic GL report generator.
+
+Real GL reports are confidential, so this builds fake ones that follow the
+same fixed-width layout Cougar Mountain spits out: pages separated by seven
+newlines, an eight line page header, account header lines, one or two line
+entries tagged AP/AR/GL/PS/PR (plus the untagged CNIN and BRKIN lines),
+month totals, Balance Forward blocks and the report totals at the very end.
+Long descriptions push the tag and amount to the right, which is what makes
+amounts ambiguous in the first place. Some of those have the amount jammed
+right up against the tag (e.g. "...deposit paGL16,849.58"), like the real
+reports do when there's no room left on the line.
+"""
+
+from utils import *
+from typing import Iterator, List, Tuple
+
+import random
+import argparse
+
+PAGE_LINES = 60
+PAGE_BREAK = "\n" * 7
+
+# Where amounts end in a stripped entry line that hasn't been pushed
+DEBIT_END = 69
+CREDIT_END = CREDIT_INDEX
+
+WORDS = [
+    "phone", "bills", "rent", "deposit", "landlord", "security", "repair",
+    "ring", "watch", "chain", "invoice", "refund", "transfer", "monthly",
+    "cheque", "void", "service", "insurance", "parking", "supplies",
+    "cleaning", "appraisal", "polish", "clasp", "pendant", "bracelet",
+]
+
+# (header number, header, family) for the accounts a report can contain
+ACCOUNTS: List[Tuple[str, str, str]] = [
+    ("1010", CFLOAT.format(loc="Hby"), "cfloat"),
+    ("1020", CCAIN, "generic"),
+    ("1030", CCAOUT, "generic"),
+    ("1200", ACCREC, "generic"),
+    ("1210", GSTINC, "generic"),
+    ("1300", INVENT, "inventory"),
+    ("1310", PURCH, "inventory"),
+    ("2100", ACCPAY, "generic"),
+    ("2110", ACCPAYC, "generic"),
+    ("2200", CPPPAY.format(pos="Staff"), "generic"),
+    ("2300", DTSHR, "shareholder"),
+    ("4010", SALESH, "generic"),
+    ("4020", SALESA, "generic"),
+    ("5010", COGSOL, "generic"),
+    ("5020", COGSBI, "cogs"),
+    ("5030", COGSMI, "cogs"),
+    ("5100", RENTH, "generic"),
+    ("5110", TELEH, "generic"),
+    ("5120", WAGESH, "generic"),
+    ("5130", OFFICE, "generic"),
+]
+
+# Which tags each family of handler understands, and where the
+# identifier stops for each of them
+LAYOUTS = {
+    "generic": {"AP": 20, "AR": 15, "GL": 16, "PS": 16, "PR": 15, None: 15},
+    "inventory": {"PS": 16, "AP": 20, "GL": 15, None: 15},
+    "cogs": {"PS": 16, "AP": 20, "GL": 17, None: 15},
+    "shareholder": {"GL": 16, "AP": 20, None: 15},
+    "cfloat": {"GL": 16, "AP": 16},
+}
+
+# The (squeezed, padded) break markers used by untagged lines
+BREAKS = {
+    "generic": BR1,
+    "inventory": BR1,
+    "cogs": BR2,
+    "shareholder": SH2,
+}
+
+
+def fmt(cents: int) -> str:
+    """
+    Format an amount in cents the way the report does, e.g. 1,234.56.
+    """
+
+    return f"{abs(cents) / 100:,.2f}"
+
+
+def words(rng: random.Random, length: int) -> str:
+    """
+    Some random lowercase words, exactly `length` characters long.
+    Lowercase so they can never be mistaken for a tag.
+    """
+
+    text = ""
+    while len(text) < length:
+        text += rng.choice(WORDS) + " "
+
+    return text[:length].rstrip().ljust(length, "x")
+
+
+class Generator:
+    def __init__(
+        self,
+        yr: int = 2022,
+        ambiguity: float = 0.05,
+        seed: int = 0,
+        page_lines: int = PAGE_LINES,
+        jammed: float = 0.5,
+    ):
+        """
+        `ambiguity` is the fraction of entries pushed past the credit
+        column, and `jammed` the fraction of those with no space at all
+        between the tag and the amount.
+        """
+
+        self.yr = yr
+        self.ambiguity = ambiguity
+        self.jammed = jammed
+        self.rng = random.Random(seed)
+        self.page_lines = page_lines
+        self.debits = 0
+        self.credits = 0
+
+    def identifier(self, tag: str, length: int) -> str:
+        """
+        A random identifier of the given length.
+        """
+
+        digits = "".join(self.rng.choice("0123456789") for _ in range(12))
+        if tag == "AP":
+            return ("AP" + digits)[:length]
+
+        return digits[:length]
+
+    def entry(
+        self, date: str, family: str, tag: str, cents: int
+    ) -> List[str]:
+        """
+        Build the line(s) for a single tagged entry.
+        Positive cents are debits, negative cents are credits.
+        """
+
+        ind = LAYOUTS[family][tag]
+        iden = self.identifier(tag, ind - 8)
+        amt = fmt(cents)
+
+        pushed = self.rng.random() < self.ambiguity
+        if pushed and self.rng.random() < self.jammed:
+            # The tag right after the description and the amount right
+            # after the tag, ending past the credit column so it can
+            # only be told apart by the totals
+            over = self.rng.randint(0, 8)
+            desc = words(
+                self.rng, CREDIT_INDEX + 1 + over - ind - len(tag + amt)
+            )
+            line = date + iden + desc + tag + amt
+        elif pushed:
+            # Long enough to push the tag past its column and the amount
+            # just past the credit column whichever side it's on, with a
+            # space or few after the tag (e.g. "...WarehouseGL  1,456.91"),
+            # which is what makes it ambiguous
+            end = CREDIT_INDEX + 1 + self.rng.randint(0, 4)
+            gap = self.rng.randint(1, 3)
+            desc = words(self.rng, end - len(amt) - gap - len(tag) - ind)
+            line = date + iden + desc + tag + " " * gap + amt
+        else:
+            desc = words(self.rng, self.rng.randint(4, 50 - ind - 2))
+            line = (date + iden + desc).ljust(TAG_INDEX) + tag
+            end = DEBIT_END if cents > 0 else CREDIT_END
+            line += amt.rjust(end - len(line))
+
+        return [line, " " * 8 + words(self.rng, self.rng.randint(5, 30))]
+
+    def untagged(self, date: str, family: str, cents: int) -> List[str]:
+        """
+        Build an untagged BRKIN/SHIN line, or a CNIN line.
+        The marker is glued to the front of the amount, which is why
+        the processor has to swap it for spaces before reading the amount.
+        """
+
+        iden = self.identifier("", 7)
+        amt = fmt(cents)
+        if family == "inventory" and self.rng.random() < 0.3:
+            return [f"{date}{iden}Stock count TC: 1CNIN{amt}"]
+
+        loc = self.rng.choice(["WAREHOUSE", "HBY", "ABDN"])
+        desc = words(self.rng, self.rng.randint(4, 20)) + " " + loc
+        line = (date + iden + desc).ljust(TAG_INDEX)
+
+        # The marker gets squeezed down to one space before the amount is
+        # read, so the amount has to end further out to compensate.
+        marker = BREAKS[family]
+        end = (DEBIT_END if cents > 0 else CREDIT_END) + len(marker) - 1
+        return [line + (marker + amt).rjust(end - len(line))]
+
+    def amount(self) -> int:
+        """
+        A random amount in cents, occasionally a large one.
+        """
+
+        cents = int(self.rng.lognormvariate(9, 1.6))
+        cents = max(cents, 1)
+        if self.rng.random() < 0.001:
+            cents *= 1000
+
+        return cents if self.rng.random() < 0.5 else -cents
+
+    def account(self, family: str, n: int) -> Iterator[List[str]]:
+        """
+        Build the blocks of lines for one account with about n entries.
+        Each block is a group of lines that can't be split across pages.
+        """
+
+        tags = [t for t in LAYOUTS[family] if t is not None]
+        debits, credits = 0, 0
+        per_month = max(n // 12, 1)
+        for month in range(1, 13):
+            mdeb, mcred = 0, 0
+            count = self.rng.randint(0, 2 * per_month)
+            days = sorted(self.rng.randint(1, 28) for _ in range(count))
+            for day in days:
+                date = f"{month:02}/{day:02}/{self.yr % 100:02}"
+                cents = self.amount()
+                if None in LAYOUTS[family] and self.rng.random() < 0.05:
+                    block = self.untagged(date, family, cents)
+                    if "CNIN" in block[0]:
+                        yield block
+                        continue
+                else:
+                    tag = self.rng.choice(tags)
+                    block = self.entry(date, family, tag, cents)
+
+                yield block
+                if cents > 0:
+                    mdeb += cents
+                else:
+                    mcred -= cents
+
+            if mdeb or mcred:
+                m = MONTH_INDICES[month]
+                yield [
+                    f"Totals for {m}".ljust(50)
+                    + fmt(mdeb).rjust(15) + fmt(mcred).rjust(15)
+                ]
+
+            debits += mdeb
+            credits += mcred
+
+        opening = self.amount() * 10
+        closing = opening + debits - credits
+
+        def dr(c: int) -> str:
+            return "DR" if c >= 0 else "CR"
+
+        # The totals have to be added up before the last block goes out
+        self.debits += debits
+        self.credits += credits
+        yield [
+            "Balance Forward".ljust(20) + "Debits".rjust(15)
+            + "Credits".rjust(15) + "Net Change".rjust(15)
+            + "Ending Balance".rjust(20),
+            f"{fmt(opening)} {dr(opening)}".rjust(20)
+            + fmt(debits).rjust(15) + fmt(credits).rjust(15)
+            + f"{fmt(debits - credits)} {dr(debits - credits)}".rjust(15)
+            + f"{fmt(closing)} {dr(closing)}".rjust(20),
+            "",
+        ]
+
+    def page_header(self, n: int) -> List[str]:
+        """
+        The eight useless lines at the top of every page.
+        """
+
+        return [
+            "High End Resale Ltd.",
+            "General Ledger Report",
+            f"For the Period 01/01/{self.yr % 100:02} "
+            f"to 12/31/{self.yr % 100:02}",
+            f"Page {n}",
+            "",
+            "Account",
+            "-" * 80,
+            "",
+        ]
+
+    def pages(self, lines: int) -> Iterator[List[str]]:
+        """
+        Build a whole report with roughly the given number of lines,
+        a page at a time, so even huge reports don't have to fit in memory.
+        """
+
+        page: List[str] = []
+        count = 0
+        columns = (
+            "Date    Reference   Description    Source    Debits    Credits"
+        )
+
+        def new_page(title: Optional[str]) -> Optional[List[str]]:
+            nonlocal page, count
+            done = page or None
+            if done:
+                count += 1
+
+            page = self.page_header(count + 1)
+            if title is not None:
+                page += [title, columns]
+
+            return done
+
+        # Spread the lines over the accounts, roughly 2.2 lines per entry
+        entries = max(int(lines / 2.2), len(ACCOUNTS))
+        weights = [self.rng.random() + 0.2 for _ in ACCOUNTS]
+        total = sum(weights)
+
+        new_page(None)
+        for (num, header, family), w in zip(ACCOUNTS, weights):
+            title = f"{num}    {header}"
+            n = max(int(entries * w / total), 1)
+            blocks = self.account(family, n)
+            if len(page) + 4 > self.page_lines:
+                yield new_page(title)
+            else:
+                page += [title, columns]
+
+            for block in blocks:
+                if len(page) + len(block) > self.page_lines:
+                    yield new_page(title)
+
+                page += block
+
+        totals = [
+            "Totals for Report",
+            "",
+            "0.00 DR".rjust(20) + fmt(self.debits).rjust(15)
+            + fmt(self.credits).rjust(15),
+        ]
+        if len(page) + len(totals) > self.page_lines:
+            yield new_page(None)
+
+        yield page + totals
+
+    def report(self, lines: int) -> str:
+        """
+        Build a whole report with roughly the given number of lines.
+        """
+
+        pages = ("\n".join(p) for p in self.pages(lines))
+        return PAGE_BREAK.join(pages) + "\n"
+
+
+def generate(
+    filename: str,
+    lines: int,
+    yr: int = 2022,
+    ambiguity: float = 0.05,
+    seed: int = 0,
+    jammed: float = 0.5,
+) -> None:
+    """
+    Write a synthetic GL report with roughly the given number of lines.
+    """
+
+    generator = Generator(yr, ambiguity, seed, jammed=jammed)
+    with open(filename, "w") as f:
+        for i, page in enumerate(generator.pages(lines)):
+            if i > 0:
+                f.write(PAGE_BREAK)
+
+            f.write("\n".join(page))
+
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic GL report."
+    )
+    parser.add_argument("filename", type=str, help="Where to write it.")
+    parser.add_argument(
+        "--lines", type=int, default=10_000, help="Roughly how many lines."
+    )
+    parser.add_argument("--year", type=int, default=2022)
+    parser.add_argument(
+        "--ambiguity",
+        type=float,
+        default=0.05,
+        help="Fraction of entries pushed past the credit column.",
+    )
+    parser.add_argument(
+        "--jammed",
+        type=float,
+        default=0.5,
+        help="Fraction of those with the amount jammed against the tag.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    generate(
+        args.filename,
+        args.lines,
+        args.year,
+        args.ambiguity,
+        args.seed,
+        args.jammed,
+    )
@@ -1,6 +1,10 @@
 import re
-from typing import Tuple, Optional, Dict, Any
-from dataclasses import dataclass
+import math
+import bisect
+import functools
+import itertools
+import numpy as np
+from typing import Tuple, Optional, Dict, Any, List, NamedTuple
 from decimal import Decimal
 from datetime import datetime
 
@@ -40,6 +44,50 @@ CREDIT_INDEX = 74
 # Sometimes it's 16, sometimes it's 17. Shove it in a constant.
 PS_INDEX = 16
 
+# Where the identifier ends (and the description starts) in an entry line,
+# by tag, for each kind of handler. None is for untagged lines.
+GENERIC_LAYOUT = {
+    "AP": 20, "AR": 15, "GL": 16, "PS": PS_INDEX, "PR": 15, None: 15
+}
+INVENTORY_LAYOUT = {"PS": PS_INDEX, "AP": 20, "GL": 15, None: 15}
+COGS_LAYOUT = {"PS": PS_INDEX, "AP": 20, "GL": 17, None: 15}
+SHAREHOLDER_LAYOUT = {"GL": 16, "AP": 20, None: 15}
+CFLOAT_LAYOUT = {tag: 16 for tag in TAGS + [None]}
+
+# Generic GL identifiers that start with a digit end where PS ones do
+GENERIC_DIGIT_LAYOUT = GENERIC_LAYOUT | {"GL": PS_INDEX}
+
+# Kinds of line, see classify_lines
+(
+    ENTRY,
+    CONTINUATION,
+    MONTH_TOTAL,
+    BALANCE_FORWARD,
+    ACCOUNT_HEADER,
+    REPORT_TOTAL,
+) = range(6)
+
+# Everything but the month names only counts at the start of a line;
+# a month name anywhere makes a month total (unless it's an entry).
+LINE_START = re.compile(
+    r"(?P<entry>\d{2}/\d{2}/\d{2})"
+    r"|(?P<balfor>Balance Forward)"
+    r"|(?P<report>Totals for Report)(?= {10}|$)"
+    r"|(?P<header>(?=\S+ {4}\S))"
+)
+MONTH_NAME = re.compile("|".join(MONTHS))
+KIND_GROUPS = {
+    "entry": ENTRY,
+    "balfor": BALANCE_FORWARD,
+    "report": REPORT_TOTAL,
+    "header": ACCOUNT_HEADER,
+}
+
+DATE = re.compile(r"\d{2}/\d{2}/\d{2}")
+AMOUNT = re.compile(r"\d+\.\d\d")
+CNIN = re.compile(r"TC: \dCNIN")
+NON_SPACE = re.compile(r"\S*")
+
 # =============================================================================
 # Basic utility functions
 
@@ -95,11 +143,8 @@ def extract_balances(line: str) -> Tuple[Decimal]:
     Index 1 is debits, index 2 is credits.
     """
 
-    line = line.replace(",", "")
-    return (
-        Decimal(re.findall(r"\d+\.\d\d", line)[1]),
-        Decimal(re.findall(r"\d+\.\d\d", line)[2]),
-    )
+    amts = AMOUNT.findall(line.replace(",", ""))
+    return Decimal(amts[1]), Decimal(amts[2])
 
 
 def extract_balance_forwards(line: str) -> Tuple[Decimal]:
@@ -151,11 +196,40 @@ def extract_totals(line: str) -> Tuple[Decimal]:
     Index 0 is debits, index 1 is credits.
     """
 
-    line = line.replace(",", "")
-    return (
-        Decimal(re.findall(r"\d+\.\d\d", line)[0]),
-        Decimal(re.findall(r"\d+\.\d\d", line)[1]),
-    )
+    amts = AMOUNT.findall(line.replace(",", ""))
+    return Decimal(amts[0]), Decimal(amts[1])
+
+
+def classify_lines(lines: List[str]) -> List[int]:
+    """
+    Label every (stripped) line of a page with what kind of line it is,
+    up front, instead of a handful of checks per line in line_loop.
+    Month names are found with one search over the whole page, since
+    they're rare and can be anywhere in the line.
+
+    The labels agree with the checks line_loop used to make, in the
+    same order: anything starting with a date is an entry, otherwise
+    anything mentioning a month is a month total, and so on.
+    Whatever isn't recognized is a continuation line.
+    """
+
+    match = LINE_START.match
+    kinds = [
+        KIND_GROUPS[m.lastgroup] if (m := match(line)) else CONTINUATION
+        for line in lines
+    ]
+
+    text = "\n".join(lines)
+    ends = None
+    for m in MONTH_NAME.finditer(text):
+        if ends is None:
+            ends = list(itertools.accumulate(len(line) + 1 for line in lines))
+
+        i = bisect.bisect_right(ends, m.start())
+        if kinds[i] != ENTRY:
+            kinds[i] = MONTH_TOTAL
+
+    return kinds
 
 
 def is_entry(line: str) -> bool:
@@ -163,7 +237,7 @@ def is_entry(line: str) -> bool:
     Is the line an entry? Check if it starts with a date in MM/DD/YY format.
     """
 
-    return re.match(r"^\d{2}/\d{2}/\d{2}", line.strip()) is not None
+    return DATE.match(line.strip()) is not None
 
 
 def extract_tag(line: str) -> Optional[str]:
@@ -195,21 +269,423 @@ def extract_amt(line: str, mul: Optional[int] = None) -> Tuple[Decimal, bool]:
 
     assert mul in [-1, 1]
 
-    cand = line.split()[-1].replace(",", "")
-    if len(line) > CREDIT_INDEX:
-        return Decimal(re.findall(r"\d+\.\d\d", cand)[0]) * mul, True
-    elif re.fullmatch(r"\d+\.\d\d", cand):
+    # One search does the work of the old findall/fullmatch/match calls:
+    # a match starting at 0 is what re.match would find, and if it also
+    # runs to the end it's what re.fullmatch would find.
+    cand = line.rsplit(None, 1)[-1].replace(",", "")
+    m = AMOUNT.search(cand)
+    if m is None:
+        raise ValueError(f"No amount found in {line!r}.")
+    elif len(line) > CREDIT_INDEX:
+        return Decimal(m.group()) * mul, True
+    elif m.start() == 0 and m.end() == len(cand):
         return Decimal(cand) * mul, False
-    elif re.match(r"\d+\.\d\d", cand):
+    elif m.start() == 0:
         # Interesting
         print(f"Very interesting, {cand}")
         return Decimal(cand) * mul, False
-    elif re.search(r"\d+\.\d\d", cand) and mul == 1:
-        amt = Decimal(re.findall(r"\d+\.\d\d", cand)[0]) * mul
-        return Decimal(amt) * mul, False
+    elif mul == 1:
+        return Decimal(m.group()), False
+    else:
+        return Decimal(m.group()) * mul, True
+
+
+# =============================================================================
+# Entry tokenizer
+#
+# Every handler needs the same handful of things out of an entry line,
+# so pull them all out in one go instead of re-scanning the line for each.
+
+
+class Entry(NamedTuple):
+    """
+    A parsed entry line. The identifier always starts at index 8,
+    right after the date; the spans are indices into `line`.
+    For untagged lines, `loc` is the location the line mentions,
+    which stands in for the tag.
+    """
+
+    line: str
+    date: str
+    tag: Optional[str]
+    iden_end: int
+    desc_start: int
+    desc_end: int
+    amt: Optional[Decimal]
+    ambiguous: bool
+    column: int
+    loc: Optional[str] = None
+    cnin: bool = False
+
+    @property
+    def identifier(self) -> str:
+        return self.line[8:self.iden_end]
+
+    @property
+    def desc(self) -> str:
+        return self.line[self.desc_start:self.desc_end].strip()
+
+    @property
+    def source(self) -> Optional[str]:
+        """
+        What ends up in Transaction.tag: the tag, or the location.
+        """
+
+        return self.tag if self.tag is not None else self.loc
+
+
+def desc_end(line: str, start: int, sep: Optional[str]) -> int:
+    """
+    Where line[start:].split(sep)[0] stops, as an index into line.
+    """
+
+    if sep is not None:
+        i = line.find(sep, start)
+        return i if i >= 0 else len(line)
+
+    # split(None) splits on whitespace, so that's the first word
+    rest = line[start:]
+    i = start + len(rest) - len(rest.lstrip())
+    m = NON_SPACE.match(line, i)
+    return m.end() if m else i
+
+
+def tokenize_entry(
+    line: str,
+    layout: Dict[Optional[str], int],
+    breaks: Optional[Tuple[str, str]] = None,
+    skip_cnin: bool = False
+) -> Optional[Entry]:
+    """
+    Parse a (stripped) entry line once. Returns None if it isn't an entry.
+
+    `layout` says where the identifier ends for each tag the handler
+    understands (None for untagged lines); a tag that isn't in it comes
+    back with empty spans and no amount, for the handler to complain about.
+
+    For untagged lines, `breaks` is the (squeezed, padded) pair of markers
+    that get swapped for one space and for spaces of the same width
+    before reading the amount. If `skip_cnin` is set, CNIN lines come
+    back flagged instead of parsed.
+    """
+
+    if not DATE.match(line):
+        return None
+
+    date = line[:8]
+    tag = extract_tag(line)
+    if tag not in layout:
+        return Entry(line, date, tag, 8, 8, 8, None, False, len(line))
+
+    ind = layout[tag]
+    if tag is None and skip_cnin and CNIN.search(line):
+        return Entry(line, date, tag, ind, ind, ind, None, False, len(line),
+                     cnin=True)
+    elif tag is None and breaks is not None:
+        loc = location(line, uppercase=True)
+        squeeze, pad = breaks
+        g = line.replace(squeeze, " ").replace(pad, " " * len(pad))
+        amt, amb = extract_amt(g)
+        end = desc_end(line, ind, loc)
+        return Entry(line, date, tag, ind, ind, end, amt, amb, len(g), loc)
+
+    amt, amb = extract_amt(line)
+    end = desc_end(line, ind, tag)
+    return Entry(line, date, tag, ind, ind, end, amt, amb, len(line))
+
+
+# =============================================================================
+# Disambiguation
+#
+# Choosing signs for the ambiguous amounts of a month is a subset sum problem:
+# the amounts that end up as debits have to add up to a known target.
+# Everything is done in integer cents, so the comparisons are exact.
+
+# Up to this many amounts, split them in half and join the sorted sums of
+# the halves (2^(n/2) work each). Past it, the halves get too big to hold.
+MITM_LIMIT = 40
+
+# Past MITM_LIMIT, a bitset of reachable sums is the quickest while the
+# amounts are small, but it grows with the target, so it's only used
+# while it fits in this much memory. Otherwise the amounts are split in
+# four (see subset_sum_four_way), which takes as long as splitting them
+# in half but only ever holds about FOUR_WAY_CHUNK sums at a time.
+BITSET_BYTES = 256 * 2**20
+FOUR_WAY_CHUNK = 2**18
+
+
+def to_cents(amt: Decimal) -> int:
+    """
+    Convert an amount to an integer number of cents.
+    """
+
+    return int(amt * 100)
+
+
+def half_sums(amounts: List[int]) -> np.ndarray:
+    """
+    All 2^n subset sums of the amounts. Bit j of an index into
+    the result says whether amounts[j] is part of that sum.
+    """
+
+    sums = np.zeros(1, dtype=np.int64)
+    for a in amounts:
+        sums = np.concatenate((sums, sums + a))
+
+    return sums
+
+
+def subset_sum_mitm(
+    amounts: List[int], target: int
+) -> Tuple[Optional[List[bool]], int]:
+    """
+    Meet-in-the-middle subset sum. Splits the amounts in half, enumerates
+    the sums of each half, and looks up target - (left sum) in the
+    sorted right sums.
+
+    Returns which amounts were picked (or None) and the number of
+    subsets that hit the target, capped at 2.
+    """
+
+    k = len(amounts) // 2
+    left, right = half_sums(amounts[:k]), half_sums(amounts[k:])
+    order = np.argsort(right, kind="stable")
+    right = right[order]
+
+    need = target - left
+    lo = np.searchsorted(right, need, side="left")
+    hi = np.searchsorted(right, need, side="right")
+    counts = hi - lo
+    matches = int(counts.sum())
+    if matches == 0:
+        return None, 0
+
+    i = int(np.flatnonzero(counts)[0])
+    j = int(order[lo[i]])
+    picked = [bool(i >> b & 1) for b in range(k)]
+    picked += [bool(j >> b & 1) for b in range(len(amounts) - k)]
+
+    return picked, min(matches, 2)
+
+
+def bitset_bytes(amounts: List[int], target: int) -> int:
+    """
+    Roughly how much memory subset_sum_bitset needs: the bitsets it keeps,
+    plus a few more for the ones being worked on.
+    """
+
+    step = max(1, math.isqrt(len(amounts)))
+    return (len(amounts) // step + step + 4) * (target // 8 + 1)
+
+
+def subset_sum_bitset(
+    amounts: List[int], target: int
+) -> Tuple[Optional[List[bool]], int]:
+    """
+    Subset sum over a bitset of reachable sums (bit s is set if some subset
+    adds up to s), one shift per amount. Only every sqrt(n)th prefix is
+    kept; walking the choice back from the last amount to the first, the
+    prefixes in between are worked out again from the one before them.
+
+    Returns the same thing as subset_sum_mitm. Having two ways to
+    reach the remaining sum anywhere on the way back means there's
+    more than one subset.
+    """
+
+    mask = (1 << (target + 1)) - 1
+    step = max(1, math.isqrt(len(amounts)))
+    kept = {0: 1}
+    reach = 1
+    for i, a in enumerate(amounts, start=1):
+        reach = (reach | (reach << a)) & mask
+        if i % step == 0:
+            kept[i] = reach
+
+    if not reach >> target & 1:
+        return None, 0
+
+    picked = [False] * len(amounts)
+    matches = 1
+    t = target
+    end = len(amounts)
+    while end > 0:
+        start = (end - 1) // step * step
+        prefixes = [kept[start]]
+        for a in amounts[start:end - 1]:
+            prefixes.append((prefixes[-1] | (prefixes[-1] << a)) & mask)
+
+        for i in reversed(range(start, end)):
+            a = amounts[i]
+            prefix = prefixes[i - start]
+            skip = prefix >> t & 1
+            take = t >= a and prefix >> (t - a) & 1
+            if skip and take:
+                matches = 2
+
+            if not skip:
+                picked[i] = True
+                t -= a
+
+        end = start
+
+    return picked, matches
+
+
+def pair_sums(
+    first: np.ndarray,
+    second: np.ndarray,
+    by_residue: np.ndarray,
+    starts: np.ndarray,
+    m: int,
+    r: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Every first[i] + second[j] that's r mod m, with i and j. `by_residue`
+    is the order that sorts `second` by residue mod m, and `starts` is
+    where each residue starts in it.
+    """
+
+    want = (r - first) % m
+    counts = starts[want + 1] - starts[want]
+    i = np.repeat(np.arange(len(first)), counts)
+    ends = np.cumsum(counts)
+    within = np.arange(len(i)) - np.repeat(ends - counts, counts)
+    j = by_residue[starts[want[i]] + within]
+    return first[i] + second[j], i, j
+
+
+def subset_sum_four_way(
+    amounts: List[int], target: int
+) -> Tuple[Optional[List[bool]], int]:
+    """
+    Subset sum, with the amounts split in four (Schroeppel and Shamir's
+    trick, done with residues like Howgrave-Graham and Joux). For every
+    r mod m, the sums of the first two quarters that are r mod m are
+    joined with the sums of the last two that are target - r mod m, so
+    the same 2^(n/2) work as subset_sum_mitm is done a slice at a time.
+
+    Returns the same thing as subset_sum_mitm. Stops as soon as it
+    finds a second subset, which with this many amounts is usually
+    quick, but when there's one subset or none every slice has to be
+    looked at: that's about 5 seconds for 48 amounts and 20 for 52 to
+    56, four times as long for every four amounts after that. Use a
+    timeout (see GLProcessor.process) to give up on those.
+    """
+
+    cuts = [len(amounts) * i // 4 for i in range(5)]
+    sums = [half_sums(amounts[a:b]) for a, b in zip(cuts, cuts[1:])]
+
+    # Pick m so that each slice has about FOUR_WAY_CHUNK sums on each side
+    m = max(1, len(sums[0]) * len(sums[1]) // FOUR_WAY_CHUNK)
+    tables = []
+    for second in (sums[1], sums[3]):
+        by_residue = np.argsort(second % m, kind="stable")
+        starts = np.searchsorted(
+            second[by_residue] % m, np.arange(m + 1)
+        )
+        tables.append((by_residue, starts))
+
+    picked = None
+    matches = 0
+    for r in range(m):
+        left, i1, i2 = pair_sums(sums[0], sums[1], *tables[0], m, r)
+        right, i3, i4 = pair_sums(
+            sums[2], sums[3], *tables[1], m, (target - r) % m
+        )
+        if len(left) == 0 or len(right) == 0:
+            continue
+
+        # Sorting just the values is much quicker than argsort, and
+        # almost every slice has nothing in it anyway
+        right_sorted = np.sort(right)
+        need = target - left
+        lo = np.searchsorted(right_sorted, need)
+        hits = right_sorted[np.minimum(lo, len(right) - 1)] == need
+        if not hits.any():
+            continue
+
+        need = need[hits]
+        found = int(
+            (np.searchsorted(right_sorted, need, side="right")
+             - lo[hits]).sum()
+        )
+        if picked is None:
+            k = int(np.flatnonzero(hits)[0])
+            l = int(np.flatnonzero(right == need[0])[0])
+            picked = []
+            for idx, (a, b) in zip(
+                (i1[k], i2[k], i3[l], i4[l]), zip(cuts, cuts[1:])
+            ):
+                picked += [bool(int(idx) >> bit & 1) for bit in range(b - a)]
+
+        matches += found
+        if matches >= 2:
+            break
+
+    if picked is None:
+        return None, 0
+
+    return picked, min(matches, 2)
+
+
+def solve_signs(
+    amounts: List[int], deb: int, cred: int, net: bool = False
+) -> Tuple[Optional[List[int]], int]:
+    """
+    Pick a sign for each ambiguous amount (in cents, ignoring sign) so that
+    the debits add up to deb and the credits add up to cred. If net is set,
+    only the difference deb - cred has to match (the Inventory rule).
+
+    Returns the signs (1 for debit, -1 for credit), or None if nothing
+    works, and the number of assignments that work, capped at 2.
+    Zero amounts are left alone (they're debits either way) since
+    they would make every answer look like two.
+    """
+
+    amounts = [abs(a) for a in amounts]
+    total = sum(amounts)
+    if net:
+        if (total + deb - cred) % 2:
+            return None, 0
+
+        target = (total + deb - cred) // 2
+    elif total != deb + cred:
+        return None, 0
+    else:
+        target = deb
+
+    if target < 0 or target > total:
+        return None, 0
+
+    # e.g. whole dollar amounts can't add up to a target with cents,
+    # which would otherwise take the longest to find out
+    divisor = math.gcd(*amounts)
+    if divisor and target % divisor:
+        return None, 0
+
+    # Picking the debits to hit the target is the same as picking the
+    # credits to hit total - target, so go with whichever is smaller.
+    flip = total - target < target
+    if flip:
+        target = total - target
+
+    nonzero = [i for i, a in enumerate(amounts) if a != 0]
+    values = [amounts[i] for i in nonzero]
+    if len(values) <= MITM_LIMIT:
+        picked, matches = subset_sum_mitm(values, target)
+    elif bitset_bytes(values, target) <= BITSET_BYTES:
+        picked, matches = subset_sum_bitset(values, target)
     else:
-        amt = Decimal(re.findall(r"\d+\.\d\d", cand)[0]) * mul
-        return amt, True
+        picked, matches = subset_sum_four_way(values, target)
+
+    if picked is None:
+        return None, 0
+
+    signs = [1] * len(amounts)
+    for i, p in zip(nonzero, picked):
+        signs[i] = 1 if p != flip else -1
+
+    return signs, matches
 
 
 # =============================================================================
@@ -378,6 +854,28 @@ GENERICS = [
     UTILA,
 ]
 
+# How the locations are spelled at the end of account headers
+LOCATION_SUFFIXES = {
+    "ware": "Ware",
+    "warehouse": "Ware",
+    "hby": "Hby",
+    "hornby st.": "Hby",
+    "abdn": "Abdn",
+    "aberdeen": "Abdn",
+}
+
+
+def header_location(header: str) -> Optional[str]:
+    """
+    Which location an account is for, going by the end of its header
+    (e.g. "Rent-Abdn", "Sales - Hornby St.", "Telephone-HBY"),
+    or None if it isn't for one in particular.
+    """
+
+    suffix = re.split(r"\s*-\s*", header)[-1]
+    return LOCATION_SUFFIXES.get(suffix.lower())
+
+
 generics_adapted = []
 for genera in GENERICS:
     if "{pos}" in genera:
@@ -396,14 +894,81 @@ GENERICS = generics_adapted
 # Transaction class, for storing information in a consistent manner
 
 
-@dataclass
+@functools.lru_cache(maxsize=4096)
+def parse_date(date: str) -> Tuple[int, int]:
+    """
+    The ordinal and month of an MM/DD/YY date. There are only a few
+    hundred distinct dates in a report, so these get cached.
+    """
+
+    dt = datetime.strptime(date, "%m/%d/%y")
+    return dt.toordinal(), dt.month
+
+
 class Transaction:
-    date: str
-    identifier: str
-    amt: Decimal
-    tag: str
-    ambiguous: bool = False
-    desc: str = ""
+    """
+    A single entry. Amounts are kept as integer cents and dates are
+    parsed once, when the transaction is made, since every pass after
+    parsing (validation, disambiguation, exporting) needs them.
+
+    The odd amount that can't be written as whole cents (or is
+    negative zero) is kept as-is in `exact`, so that `amt`, and with it
+    to_json and to_excel_json, always give back exactly what was parsed.
+    """
+
+    __slots__ = (
+        "date",
+        "identifier",
+        "cents",
+        "exact",
+        "tag",
+        "ambiguous",
+        "desc",
+        "ordinal",
+        "month",
+    )
+
+    def __init__(
+        self,
+        date: str,
+        identifier: str,
+        amt: Decimal,
+        tag: str,
+        ambiguous: bool = False,
+        desc: str = "",
+    ):
+        self.date = date
+        self.identifier = identifier
+        self.amt = amt
+        self.tag = tag
+        self.ambiguous = ambiguous
+        self.desc = desc
+        self.ordinal, self.month = parse_date(date)
+
+    @property
+    def amt(self) -> Decimal:
+        if self.exact is not None:
+            return self.exact
+
+        return Decimal(self.cents).scaleb(-2)
+
+    @amt.setter
+    def amt(self, amt: Decimal) -> None:
+        amt = Decimal(amt)
+        self.cents = int(amt * 100)
+        exponent = amt.as_tuple().exponent
+        if exponent != -2 or (self.cents == 0 and amt.is_signed()):
+            self.exact = amt
+        else:
+            self.exact = None
+
+    def __repr__(self) -> str:
+        return (
+            f"Transaction(date={self.date!r}, "
+            f"identifier={self.identifier!r}, amt={self.amt!r}, "
+            f"tag={self.tag!r}, ambiguous={self.ambiguous!r}, "
+            f"desc={self.desc!r})"
+        )
 
     def __str__(self) -> str:
         d, i, a = self.date, self.identifier, self.amt
@@ -413,7 +978,22 @@ class Transaction:
     def __eq__(self, other: "Transaction") -> bool:
         return self.date == other.date and self.identifier == other.identifier
 
+    def with_cents(self, cents: int) -> "Transaction":
+        """
+        A copy with a different amount, without parsing anything again.
+        """
+
+        t = Transaction.__new__(Transaction)
+        t.date, t.identifier = self.date, self.identifier
+        t.cents, t.exact = cents, None
+        t.tag, t.ambiguous, t.desc = self.tag, self.ambiguous, self.desc
+        t.ordinal, t.month = self.ordinal, self.month
+        return t
+
     def __neg__(self) -> "Transaction":
+        if self.exact is None and self.cents != 0:
+            return self.with_cents(-self.cents)
+
         return Transaction(
             self.date,
             self.identifier,
@@ -424,6 +1004,10 @@ class Transaction:
         )
 
     def __mul__(self, other: float) -> "Transaction":
+        # Zero goes through Decimal too, to get the sign of zero right
+        if self.exact is None and self.cents != 0 and other in (1, -1):
+            return self.with_cents(self.cents * int(other))
+
         return Transaction(
             self.date,
             self.identifier,
@@ -439,13 +1023,30 @@ class Transaction:
     def __hash__(self) -> int:
         return hash((self.date, self.identifier))
 
+    # Pickle as a plain tuple; much faster than the default for slots,
+    # which matters when workers send back whole pages of transactions
+    def __getstate__(self) -> tuple:
+        return (
+            self.date, self.identifier, self.cents, self.exact, self.tag,
+            self.ambiguous, self.desc, self.ordinal, self.month
+        )
+
+    def __setstate__(self, state: tuple) -> None:
+        (
+            self.date, self.identifier, self.cents, self.exact, self.tag,
+            self.ambiguous, self.desc, self.ordinal, self.month
+        ) = state
+
     @property
     def debit(self) -> Decimal:
         """
         Return the debit amount.
         """
 
-        return self.amt if self.amt > 0 else 0
+        if self.exact is not None:
+            return self.exact if self.exact > 0 else 0
+
+        return self.amt if self.cents > 0 else 0
 
     @property
     def credit(self) -> Decimal:
@@ -453,14 +1054,25 @@ class Transaction:
         Return the credit amount.
         """
 
-        return -self.amt if self.amt < 0 else 0
+        if self.exact is not None:
+            return -self.exact if self.exact < 0 else 0
+
+        return -self.amt if self.cents < 0 else 0
+
+    @property
+    def debit_cents(self) -> int:
+        return self.cents if self.cents > 0 else 0
+
+    @property
+    def credit_cents(self) -> int:
+        return -self.cents if self.cents < 0 else 0
 
     def to_datetime(self) -> datetime:
         """
         Convert the date to a datetime object.
         """
 
-        return datetime.strptime(self.date, "%m/%d/%y")
+        return datetime.fromordinal(self.ordinal)
 
     def to_json(self) -> Dict[str, str]:
         """
@@ -476,6 +1088,47 @@ class Transaction:
             "desc": self.desc,
         }
 
+    @classmethod
+    def from_json(cls, d: Dict[str, Any]) -> "Transaction":
+        """
+        The inverse of to_json.
+        """
+
+        return cls(
+            d["date"],
+            d["identifier"],
+            Decimal(d["amt"]),
+            d["tag"],
+            d["ambiguous"],
+            d["desc"],
+        )
+
+    def to_row(self) -> list:
+        """
+        Everything the transaction holds, as a JSON list, for from_row
+        to put back together without parsing the date or amount again.
+        """
+
+        exact = None if self.exact is None else str(self.exact)
+        return [
+            self.date, self.identifier, self.cents, exact, self.tag,
+            self.ambiguous, self.desc, self.ordinal, self.month,
+        ]
+
+    @classmethod
+    def from_row(cls, row: list) -> "Transaction":
+        """
+        The inverse of to_row.
+        """
+
+        t = cls.__new__(cls)
+        (
+            t.date, t.identifier, t.cents, exact, t.tag,
+            t.ambiguous, t.desc, t.ordinal, t.month,
+        ) = row
+        t.exact = None if exact is None else Decimal(exact)
+        return t
+
     def to_excel_json(self, header: Optional[str]=None) -> Dict[str, Any]:
         """
         Convert the transaction to a JSON serializable object,
@@ -485,12 +1138,17 @@ class Transaction:
         """
 
         d = {} if header is None else { "account": header }
+        if self.exact is None:
+            # Same floats as going through Decimal, both are correctly rounded
+            debit, credit = self.debit_cents / 100, self.credit_cents / 100
+        else:
+            debit, credit = float(self.debit), float(self.credit)
 
         return d | {
             "date": self.date,
             "identifier": self.identifier,
-            "debit": "" if self.credit > 0 else float(self.debit),
-            "credit": "" if self.credit == 0 else float(self.credit),
+            "debit": "" if credit > 0 else debit,
+            "credit": "" if credit == 0 else credit,
             "tag": self.tag,
             "desc": self.desc,
         }
@@ -519,3 +1177,45 @@ if __name__ == "__main__":
     assert extract_amt(ambiguous) == (Decimal("-16849.58"), True)
     assert extract_amt(large) == (Decimal("-1456501.91"), True)
     assert extract_amt(not_amb) == (Decimal("7342.66"), False)
+
+    # The tokenizer pulls the same things out of a line the handlers did
+    e = tokenize_entry(credit, GENERIC_LAYOUT)
+    assert (e.tag, e.identifier, e.desc) == (
+        "AP", "AP0642100006", "CellJan22phone bills"
+    )
+    assert (e.amt, e.ambiguous) == (Decimal("-409.23"), False)
+    e = tokenize_entry(ambiguous, GENERIC_LAYOUT)
+    assert (e.tag, e.identifier) == ("GL", "APR22-06")
+    assert e.desc == "Record Abdn landlord Fairchild security deposit pa"
+    assert (e.amt, e.ambiguous) == (Decimal("-16849.58"), True)
+    assert tokenize_entry("Totals for January", GENERIC_LAYOUT) is None
+
+    # Disambiguation: one answer, more than one, none, and Inventory's rule
+    assert solve_signs([100, 250, 400], 500, 250) == ([1, -1, 1], 1)
+    signs, matches = solve_signs([100, 100, 200], 200, 200)
+    assert matches == 2
+    assert sum(a for a, s in zip([100, 100, 200], signs) if s > 0) == 200
+    assert solve_signs([100, 250], 200, 150) == (None, 0)
+    assert solve_signs([300, 100], 500, 300) == (None, 0)
+    assert solve_signs([300, 100], 500, 300, net=True) == ([1, -1], 1)
+
+    # Whole dollars can't make up cents, however many amounts there are
+    assert solve_signs([1200, 700, 3000] * 20, 11550, 86450) == (None, 0)
+
+    # Every way of doing the subset sum gives the same answer
+    amounts = [1200, 700, 3000, 500, 1800, 2200, 900, 1250]
+    for target in (0, 2600, 4250, 11550, 11551):
+        expected = subset_sum_mitm(amounts, target)[1]
+        assert subset_sum_bitset(amounts, target)[1] == expected
+        assert subset_sum_four_way(amounts, target)[1] == expected
+
+    # Locations come from the end of the header, however it's spelled
+    assert header_location(CFLOAT.format(loc="Ware")) == "Ware"
+    assert header_location("Rent-Abdn") == "Abdn"
+    assert header_location("Sales - Hornby St.") == "Hby"
+    assert header_location("Sales Boxes & Chains - HBY") == "Hby"
+    assert header_location("Wages-Aberdeen") == "Abdn"
+    assert header_location("Telephone") is None
+    assert header_location("CPP Payable-Staff") is None
+
+    print("All tests passed.")